@@ -0,0 +1,334 @@
+import random
+import re
+
+# Responses follow the formats of the Riot API endpoints used by discrank.py
+
+champions = [
+    (1, 'Annie', 'Annie'), (2, 'Olaf', 'Olaf'), (3, 'Galio', 'Galio'),
+    (4, 'TwistedFate', 'Twisted Fate'), (5, 'XinZhao', 'Xin Zhao'),
+    (6, 'Urgot', 'Urgot'), (7, 'Leblanc', 'LeBlanc'),
+    (8, 'Vladimir', 'Vladimir'), (9, 'FiddleSticks', 'Fiddlesticks'),
+    (10, 'Kayle', 'Kayle'), (11, 'MasterYi', 'Master Yi'),
+    (12, 'Alistar', 'Alistar'), (13, 'Ryze', 'Ryze'), (14, 'Sion', 'Sion'),
+    (15, 'Sivir', 'Sivir'), (16, 'Soraka', 'Soraka'), (17, 'Teemo', 'Teemo'),
+    (18, 'Tristana', 'Tristana'), (19, 'Warwick', 'Warwick'),
+    (20, 'Nunu', 'Nunu'), (21, 'MissFortune', 'Miss Fortune'),
+    (22, 'Ashe', 'Ashe'), (23, 'Tryndamere', 'Tryndamere'),
+    (24, 'Jax', 'Jax'), (25, 'Morgana', 'Morgana'),
+    (26, 'Zilean', 'Zilean'), (27, 'Singed', 'Singed'),
+    (28, 'Evelynn', 'Evelynn'), (29, 'Twitch', 'Twitch'),
+    (30, 'Karthus', 'Karthus'), (31, 'Chogath', "Cho'Gath"),
+    (32, 'Amumu', 'Amumu'), (33, 'Rammus', 'Rammus'),
+    (34, 'Anivia', 'Anivia'), (35, 'Shaco', 'Shaco'),
+    (36, 'DrMundo', 'Dr. Mundo'), (37, 'Sona', 'Sona'),
+    (38, 'Kassadin', 'Kassadin'), (39, 'Irelia', 'Irelia'),
+    (40, 'Janna', 'Janna'), (59, 'JarvanIV', 'Jarvan IV'),
+    (64, 'LeeSin', 'Lee Sin'), (103, 'Ahri', 'Ahri'),
+    (222, 'Jinx', 'Jinx'), (412, 'Thresh', 'Thresh')]
+
+spells = [
+    (1, 'SummonerBoost', 'Cleanse'), (3, 'SummonerExhaust', 'Exhaust'),
+    (4, 'SummonerFlash', 'Flash'), (6, 'SummonerHaste', 'Ghost'),
+    (7, 'SummonerHeal', 'Heal'), (11, 'SummonerSmite', 'Smite'),
+    (12, 'SummonerTeleport', 'Teleport'), (13, 'SummonerMana', 'Clarity'),
+    (14, 'SummonerDot', 'Ignite'), (21, 'SummonerBarrier', 'Barrier')]
+
+tiers = ['BRONZE', 'SILVER', 'GOLD', 'PLATINUM', 'DIAMOND']
+divisions = ['I', 'II', 'III', 'IV', 'V']
+queues = ['RANKED_SOLO_5x5', 'TEAM_BUILDER_DRAFT_RANKED_5x5', 'RANKED_TEAM_5x5']
+
+class Fixtures():
+    '''
+    Deterministic stand-in data for the Riot API. Every response is derived
+    from the seed and the requested IDs, so repeated runs see the same data.
+    There are population summoners named "Summoner 0" and so on. Some of them
+    are unranked, and about in_game of them are in a live game.
+    '''
+
+    routes = [
+        ('summoner', r'/api/lol/\w+/v1\.4/summoner/by-name/([^/]+)$'),
+        ('summoner', r'/api/lol/\w+/v1\.4/summoner/([\d,]+)$'),
+        ('league', r'/api/lol/\w+/v2\.5/league/by-summoner/([\d,]+)/entry$'),
+        ('match_list', r'/api/lol/\w+/v2\.2/matchlist/by-summoner/(\d+)$'),
+        ('match', r'/api/lol/\w+/v2\.2/match/(\d+)$'),
+        ('current_game', r'/observer-mode/rest/consumer/'
+            r'getSpectatorGameInfo/\w+/(\d+)$'),
+        ('ranked_stats', r'/api/lol/\w+/v1\.3/stats/by-summoner/(\d+)/ranked$'),
+        ('mastery', r'/championmastery/location/\w+/player/(\d+)/'
+            r'(topchampions|champions|champion/\d+)$'),
+        ('static_champions', r'/api/lol/static-data/\w+/v1\.2/champion$'),
+        ('static_spells', r'/api/lol/static-data/\w+/v1\.2/summoner-spell$'),
+        ('static_versions', r'/api/lol/static-data/\w+/v1\.2/versions$')]
+
+    def __init__(self, seed=0, population=200, in_game=0.3, version='6.13.1'):
+        self.seed = seed
+        self.population = population
+        self.in_game = in_game
+        self.version = version
+        self.routes = [(name, re.compile(pattern))
+                for name, pattern in self.routes]
+
+    def get_name(self, summoner_id):
+        return 'Summoner {}'.format(summoner_id - 1000)
+
+    def get_rng(self, *keys):
+        return random.Random('{}:{}'.format(self.seed, keys))
+
+    def is_summoner(self, summoner_id):
+        return 1000 <= summoner_id < 1000 + self.population
+
+    def respond(self, path):
+        '''
+        Returns a tuple of the endpoint name, status code, and response body
+        for the given request path.
+        '''
+        for name, pattern in self.routes:
+            match = pattern.match(path)
+            if match:
+                status, body = getattr(self, name)(*match.groups())
+                return (name, status, body)
+        return ('unknown', 404, None)
+
+    def summoner(self, key):
+        by_id = key.replace(',', '').isdigit()
+        if by_id:
+            summoner_ids = [int(it) for it in key.split(',')]
+        else:
+            match = re.match(r'summoner(\d+)$', key)
+            if not match:
+                return (404, None)
+            summoner_ids = [1000 + int(match.group(1))]
+        result = {}
+        for summoner_id in summoner_ids:
+            if not self.is_summoner(summoner_id):
+                continue
+            summoner = {
+                'id': summoner_id,
+                'name': self.get_name(summoner_id),
+                'profileIconId': summoner_id % 30,
+                'summonerLevel': 30,
+                'revisionDate': 1467000000000
+            }
+            result[str(summoner_id) if by_id else key] = summoner
+        return (200, result) if result else (404, None)
+
+    def league(self, key):
+        result = {}
+        for summoner_id in (int(it) for it in key.split(',')):
+            if not self.is_summoner(summoner_id):
+                continue
+            rng = self.get_rng('league', summoner_id)
+            if rng.random() < 0.2: # Unranked
+                continue
+            wins, losses = rng.randint(10, 200), rng.randint(10, 200)
+            result[str(summoner_id)] = [{
+                'name': "Fixture's Knights",
+                'tier': rng.choice(tiers),
+                'queue': 'RANKED_SOLO_5x5',
+                'entries': [{
+                    'playerOrTeamId': str(summoner_id),
+                    'playerOrTeamName': self.get_name(summoner_id),
+                    'division': rng.choice(divisions),
+                    'leaguePoints': rng.randint(0, 100),
+                    'wins': wins,
+                    'losses': losses,
+                    'isHotStreak': False,
+                    'isVeteran': False,
+                    'isFreshBlood': False,
+                    'isInactive': False
+                }]
+            }]
+        return (200, result) if result else (404, None)
+
+    def match_list(self, summoner_id):
+        summoner_id = int(summoner_id)
+        if not self.is_summoner(summoner_id):
+            return (404, None)
+        rng = self.get_rng('match_list', summoner_id)
+        matches = []
+        for it in range(20):
+            match_id = summoner_id * 1000 + it
+            matches.append({
+                'matchId': match_id,
+                'champion': rng.choice(champions)[0],
+                'queue': rng.choice(queues),
+                'season': 'SEASON2016',
+                'timestamp': 1467000000000 - it * 3600000,
+                'lane': 'MID',
+                'role': 'SOLO',
+                'region': 'NA',
+                'platformId': 'NA1'
+            })
+        return (200, {'matches': matches, 'totalGames': len(matches),
+            'startIndex': 0, 'endIndex': len(matches)})
+
+    def get_players(self, rng, summoner_id):
+        others = [it for it in range(1000, 1000 + self.population)
+                if it != summoner_id]
+        players = [summoner_id] + rng.sample(others, min(9, len(others)))
+        rng.shuffle(players)
+        picks = rng.sample(champions, len(players))
+        return list(zip(players, picks))
+
+    def get_spells(self, rng):
+        return [it[0] for it in rng.sample(spells, 2)]
+
+    def match(self, match_id):
+        summoner_id = int(match_id) // 1000
+        if not self.is_summoner(summoner_id):
+            return (404, None)
+        rng = self.get_rng('match', match_id)
+        participants, identities = [], []
+        blue_won = rng.random() < 0.5
+        for index, (player, champion) in enumerate(
+                self.get_players(rng, summoner_id)):
+            spell1, spell2 = self.get_spells(rng)
+            team_id = 100 if index < 5 else 200
+            participants.append({
+                'participantId': index + 1,
+                'teamId': team_id,
+                'championId': champion[0],
+                'spell1Id': spell1,
+                'spell2Id': spell2,
+                'stats': {
+                    'winner': blue_won == (team_id == 100),
+                    'kills': rng.randint(0, 15),
+                    'deaths': rng.randint(0, 12),
+                    'assists': rng.randint(0, 20)
+                }
+            })
+            identities.append({
+                'participantId': index + 1,
+                'player': {
+                    'summonerId': player,
+                    'summonerName': self.get_name(player),
+                    'profileIcon': player % 30
+                }
+            })
+        bans = [it[0] for it in rng.sample(champions, 6)]
+        return (200, {
+            'matchId': int(match_id),
+            'region': 'NA',
+            'platformId': 'NA1',
+            'matchMode': 'CLASSIC',
+            'matchType': 'MATCHED_GAME',
+            'queueType': rng.choice(queues[:2]),
+            'matchDuration': rng.randint(1200, 2700),
+            'matchCreation': 1467000000000,
+            'participants': participants,
+            'participantIdentities': identities,
+            'teams': [
+                {'teamId': 100, 'winner': blue_won, 'bans': [
+                    {'championId': it, 'pickTurn': turn * 2 + 1}
+                    for turn, it in enumerate(bans[:3])]},
+                {'teamId': 200, 'winner': not blue_won, 'bans': [
+                    {'championId': it, 'pickTurn': turn * 2 + 2}
+                    for turn, it in enumerate(bans[3:])]}]
+        })
+
+    def current_game(self, summoner_id):
+        summoner_id = int(summoner_id)
+        if (not self.is_summoner(summoner_id) or
+                self.get_rng('in_game', summoner_id).random() >= self.in_game):
+            return (404, None)
+        rng = self.get_rng('current_game', summoner_id)
+        participants = []
+        for index, (player, champion) in enumerate(
+                self.get_players(rng, summoner_id)):
+            spell1, spell2 = self.get_spells(rng)
+            participants.append({
+                'teamId': 100 if index < 5 else 200,
+                'summonerId': player,
+                'summonerName': self.get_name(player),
+                'championId': champion[0],
+                'spell1Id': spell1,
+                'spell2Id': spell2,
+                'profileIconId': player % 30,
+                'bot': False
+            })
+        bans = [it[0] for it in rng.sample(champions, 6)]
+        return (200, {
+            'gameId': summoner_id * 1000 + 999,
+            'gameMode': 'CLASSIC',
+            'gameType': 'MATCHED_GAME',
+            'gameQueueConfigId': 410,
+            'gameLength': rng.randint(60, 1800),
+            'gameStartTime': 1467000000000,
+            'platformId': 'NA1',
+            'participants': participants,
+            'bannedChampions': [
+                {'championId': it, 'teamId': 100 if turn < 3 else 200,
+                    'pickTurn': turn + 1} for turn, it in enumerate(bans)]
+        })
+
+    def ranked_stats(self, summoner_id):
+        summoner_id = int(summoner_id)
+        if not self.is_summoner(summoner_id):
+            return (404, None)
+        rng = self.get_rng('ranked_stats', summoner_id)
+        played = rng.sample(champions, 12)
+        stats = []
+        for champion_id in [it[0] for it in played] + [0]: # 0 is the total
+            games = rng.randint(1, 60)
+            stats.append({'id': champion_id, 'stats': {
+                'totalSessionsPlayed': games,
+                'totalSessionsWon': rng.randint(0, games),
+                'totalChampionKills': games * rng.randint(2, 10),
+                'totalDeathsPerSession': games * rng.randint(2, 8),
+                'totalAssists': games * rng.randint(3, 12)
+            }})
+        return (200, {'summonerId': summoner_id, 'modifyDate': 1467000000000,
+            'champions': stats})
+
+    def mastery(self, summoner_id, endpoint):
+        summoner_id = int(summoner_id)
+        if not self.is_summoner(summoner_id):
+            return (404, None)
+        rng = self.get_rng('mastery', summoner_id)
+        entries = []
+        for champion in rng.sample(champions, 25):
+            points = rng.randint(100, 250000)
+            entries.append({
+                'playerId': summoner_id,
+                'championId': champion[0],
+                'championLevel': min(5, 1 + points // 20000),
+                'championPoints': points,
+                'championPointsSinceLastLevel': points % 20000,
+                'championPointsUntilNextLevel': 0 if points > 80000 else 1000,
+                'chestGranted': rng.random() < 0.4,
+                'highestGrade': rng.choice(['S+', 'S', 'A', 'B-', 'C']),
+                'lastPlayTime': 1467000000000 - rng.randint(0, 90) * 86400000
+            })
+        entries.sort(key=lambda it: it['championPoints'], reverse=True)
+        if endpoint == 'topchampions':
+            return (200, entries[:3])
+        elif endpoint == 'champions':
+            return (200, entries)
+        champion_id = int(endpoint.split('/')[1])
+        for entry in entries:
+            if entry['championId'] == champion_id:
+                return (200, entry)
+        return (204, None) # Champion not played
+
+    def static_champions(self):
+        return (200, {'type': 'champion', 'version': self.version, 'data': {
+            str(it[0]): {'id': it[0], 'key': it[1], 'name': it[2],
+                'title': 'the Fixture'} for it in champions}})
+
+    def static_spells(self):
+        return (200, {'type': 'summoner', 'version': self.version, 'data': {
+            str(it[0]): {'id': it[0], 'key': it[1], 'name': it[2],
+                'description': '', 'summonerLevel': 1} for it in spells}})
+
+    def static_versions(self):
+        return (200, [self.version, '6.12.1', '6.11.1'])
+
+    def static_snapshot(self):
+        '''
+        Returns the static data snapshot the plugin saves to static.json.
+        '''
+        return {
+            'version': self.version,
+            'champions': self.static_champions()[1]['data'],
+            'spells': self.static_spells()[1]['data']
+        }
@@ -0,0 +1,186 @@
+import argparse
+import asyncio
+import importlib.util
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+import server
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+# (Name, plan index, options, arguments) with {} in place of the summoner
+commands = [
+    ('summoner', 0, {'summoner': '{}'}, None),
+    ('summoner -extra', 0, {'summoner': '{}', 'extra': ''}, None),
+    ('match', 1, {'match': '{}'}, None),
+    ('match -basic', 1, {'match': '{}', 'basic': ''}, None),
+    ('mastery', 2, {'mastery': '{}'}, None),
+    ('mastery -champion', 2, {'mastery': '{}', 'champion': 'annie'}, None),
+    ('challenge', 3, {'challenge': ''}, ['{}', '{}', 'ahri', 'jinx']),
+    ('chests', 4, {'chests': '{}'}, None),
+    ('watch', 5, {'watch': '{}'}, None),
+    ('unwatch', 6, {'unwatch': '{}'}, None),
+    ('watchlist', 7, {}, None),
+    ('track', 8, {'track': '{}'}, None),
+    ('defaultregion', 9, {'defaultregion': 'na'}, None),
+    ('bracket', 10, {'bracket': '', 'seed': '0'},
+        ['{}', 'ahri', '{}', 'jinx', '{}', 'annie', '{}', 'teemo']),
+    ('history', 11, {'history': '{}'}, None),
+    ('stats', 12, {'stats': ''}, None),
+    ('link', 13, {'link': '{}'}, None),
+    ('leaderboard', 15, {'leaderboard': ''}, None),
+    ('unlink', 14, {'unlink': ''}, None)]
+
+# Plan indices of the commands that act for the member who sent them
+member_commands = (13, 14)
+
+def load_plugin():
+    '''
+    Loads discrank.py the same way the bot loads plugins.
+    '''
+    spec = importlib.util.spec_from_file_location(
+            'discrank.py', root + '/plugins/discrank.py')
+    plugin = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(plugin)
+    return plugin
+
+def create_bot(path, url, arguments):
+    '''
+    Returns just enough of a bot for the plugin: its configuration points at
+    the stand-in, and the benchmark user is a moderator of the only server.
+    '''
+    limits = [[int(it) for it in pair.split('/')]
+            for pair in arguments.limits.split(',')]
+    configuration = {
+        'token': 'benchmark',
+        'base_url': url,
+        'global_url': url,
+        'rate_limits': limits,
+        'max_wait': arguments.max_wait,
+        'warm_connections': 0,
+        'watchlist_limit': arguments.iterations,
+        'watchlist_interval': 3600
+    }
+    return types.SimpleNamespace(path=path, data={},
+            configurations={'discrank.py': configuration,
+                'core': {'owners': ['benchmark']}},
+            servers_data={'benchmark': {'moderators': ['benchmark']}})
+
+def get_percentile(values, percentile):
+    '''
+    Returns the given percentile of the sorted values (nearest rank).
+    '''
+    index = max(0, math.ceil(percentile / 100 * len(values)) - 1)
+    return values[index]
+
+async def run_command(plugin, bot, message, command, name):
+    title, plan_index, options, arguments = command
+    options = dict((key, value.format(name)) for key, value in options.items())
+    if arguments is not None:
+        arguments = [it.format(name) for it in arguments]
+    if plan_index in member_commands: # Every summoner gets its own member
+        message = types.SimpleNamespace(server=message.server,
+                author=types.SimpleNamespace(id=name))
+    start = time.perf_counter()
+    try:
+        await plugin.get_response(bot, message,
+                ('blitz', plan_index, options, arguments), False)
+        error = None
+    except Exception as e:
+        error = e
+    return time.perf_counter() - start, error
+
+async def run(arguments):
+    stand_in = server.create_stand_in(arguments)
+    url = await stand_in.start(port=arguments.port)
+    plugin = load_plugin()
+    results = []
+    with tempfile.TemporaryDirectory() as path:
+        os.makedirs(path + '/data/discrank.py')
+        bot = create_bot(path, url, arguments)
+        await plugin.on_ready(bot)
+        stand_in.reset()
+        server_object = types.SimpleNamespace(id='benchmark',
+                name='Benchmark', owner=types.SimpleNamespace(id='benchmark'))
+        message = types.SimpleNamespace(server=server_object,
+                author=types.SimpleNamespace(id='benchmark'))
+
+        for command in commands:
+            if arguments.cold: # Start every command with empty caches
+                for client in bot.data['discrank.py']['clients'].values():
+                    await client.session.close()
+                bot.data['discrank.py']['clients'].clear()
+                shutil.rmtree(path + '/data/discrank.py/matches')
+                plugin.get_client(bot)
+            stand_in.reset()
+            times, errors = [], 0
+            for it in range(arguments.iterations):
+                name = 'Summoner {}'.format(it % arguments.population)
+                elapsed, error = await run_command(
+                        plugin, bot, message, command, name)
+                times.append(elapsed)
+                if error is not None:
+                    errors += 1
+                    if arguments.verbose:
+                        print("{}: {}".format(command[0], error))
+            for tracker in list(plugin.trackers.values()):
+                tracker.messages.clear() # Nothing to edit, so stop polling
+            times.sort()
+            results.append({
+                'command': command[0],
+                'iterations': len(times),
+                'errors': errors,
+                'p50': get_percentile(times, 50) * 1000,
+                'p90': get_percentile(times, 90) * 1000,
+                'p99': get_percentile(times, 99) * 1000,
+                'max': times[-1] * 1000,
+                'calls': sum(stand_in.calls.values()) / len(times),
+                'throttled': stand_in.statuses[429],
+                'endpoints': dict(stand_in.calls)
+            })
+
+        for client in bot.data['discrank.py']['clients'].values():
+            await client.session.close()
+    await stand_in.stop()
+    return results
+
+def print_results(results):
+    print('{:<20}{:>6}{:>8}{:>10}{:>10}{:>10}{:>10}{:>8}{:>6}'.format(
+        'command', 'runs', 'errors', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms',
+        'calls', '429s'))
+    for result in results:
+        print(('{0[command]:<20}{0[iterations]:>6}{0[errors]:>8}'
+            '{0[p50]:>10.1f}{0[p90]:>10.1f}{0[p99]:>10.1f}{0[max]:>10.1f}'
+            '{0[calls]:>8.2f}{0[throttled]:>6}').format(result))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs every blitz command "
+            "against the local Riot API stand-in and reports latency "
+            "percentiles and upstream calls per command. The stand-in "
+            "requires aiohttp 3.0 or newer.")
+    server.add_arguments(parser)
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--iterations', type=int, default=50,
+            help="runs of each command, cycling through the summoners")
+    parser.add_argument('--limits', default='3000/10,180000/600',
+            help="client rate limits as requests/seconds pairs")
+    parser.add_argument('--max-wait', type=float, default=10)
+    parser.add_argument('--cold', action='store_true',
+            help="start each command with new clients and empty caches")
+    parser.add_argument('--json', help="also write the results to this file")
+    parser.add_argument('--verbose', action='store_true',
+            help="print command errors")
+    arguments = parser.parse_args()
+
+    results = asyncio.get_event_loop().run_until_complete(run(arguments))
+    print_results(results)
+    if arguments.json:
+        with open(arguments.json, 'w') as json_file:
+            json.dump(results, json_file, indent=4)
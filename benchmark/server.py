@@ -0,0 +1,117 @@
+import aiohttp.web
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import random
+
+from fixtures import Fixtures
+
+class StandIn():
+    '''
+    Local stand-in for the Riot API that serves the fixtures. Every response
+    is delayed by latency seconds plus up to jitter seconds, and a throttle
+    fraction of the requests are answered with a 429 and a Retry-After of
+    retry_after seconds. Static data is never throttled, just like the real
+    API. Requests are counted by endpoint and status code.
+    Serving uses aiohttp.web.AppRunner, so the stand-in needs aiohttp 3.0 or
+    newer, unlike the plugin itself.
+    '''
+
+    def __init__(self, fixtures, latency=0.05, jitter=0.02, throttle=0.0,
+            retry_after=1, seed=0):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.calls = collections.Counter() # Endpoint: requests
+        self.statuses = collections.Counter() # Status code: responses
+        self.runner = None
+
+    def reset(self):
+        self.calls.clear()
+        self.statuses.clear()
+
+    async def handle(self, request):
+        endpoint, status, body = self.fixtures.respond(request.path)
+        self.calls[endpoint] += 1
+        await asyncio.sleep(
+                self.latency + self.random.uniform(0, self.jitter))
+        rate_limited = '/static-data/' not in request.path
+        if (rate_limited and self.throttle and
+                self.random.random() < self.throttle):
+            status, body = 429, None
+            headers = {'Retry-After': str(self.retry_after)}
+        else:
+            headers = {}
+        self.statuses[status] += 1
+        if body is None:
+            return aiohttp.web.Response(status=status, headers=headers)
+        return aiohttp.web.Response(status=status, headers=headers,
+                text=json.dumps(body), content_type='application/json')
+
+    async def start(self, host='127.0.0.1', port=8080):
+        '''
+        Starts serving and returns the base URL of the stand-in.
+        '''
+        application = aiohttp.web.Application()
+        application.router.add_route('GET', '/{path:.*}', self.handle)
+        application.router.add_route('HEAD', '/{path:.*}', self.handle)
+        self.runner = aiohttp.web.AppRunner(application)
+        await self.runner.setup()
+        site = aiohttp.web.TCPSite(self.runner, host, port)
+        await site.start()
+        return 'http://{}:{}'.format(host, port)
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+def add_arguments(parser):
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--population', type=int, default=200,
+            help="number of summoners in the fixtures")
+    parser.add_argument('--in-game', type=float, default=0.3,
+            help="fraction of summoners that are in a live game")
+    parser.add_argument('--latency', type=float, default=0.05,
+            help="base response latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.02,
+            help="maximum extra latency in seconds")
+    parser.add_argument('--throttle', type=float, default=0.0,
+            help="fraction of requests answered with a 429")
+    parser.add_argument('--retry-after', type=float, default=1,
+            help="Retry-After seconds sent with a 429")
+
+def create_stand_in(arguments):
+    fixtures = Fixtures(seed=arguments.seed,
+            population=arguments.population, in_game=arguments.in_game)
+    return StandIn(fixtures, latency=arguments.latency,
+            jitter=arguments.jitter, throttle=arguments.throttle,
+            retry_after=arguments.retry_after, seed=arguments.seed)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serves the Riot API "
+            "fixtures. Point the base_url and global_url entries of "
+            "config/discrank.py.json at it to run the bot offline. "
+            "Requires aiohttp 3.0 or newer.")
+    add_arguments(parser)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    arguments = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    stand_in = create_stand_in(arguments)
+    loop = asyncio.get_event_loop()
+    url = loop.run_until_complete(
+            stand_in.start(host=arguments.host, port=arguments.port))
+    logging.info("Serving the Riot API fixtures at " + url)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logging.info("Requests by endpoint: " + str(dict(stand_in.calls)))
+        loop.run_until_complete(stand_in.stop())
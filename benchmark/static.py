@@ -0,0 +1,73 @@
+import argparse
+import timeit
+import tracemalloc
+
+import fixtures
+import run
+
+def get_lookups(plugin, snapshot):
+    '''
+    The static data as it was kept before StaticData: the champion JSON by ID
+    string and lowercase key, and the spell JSON by ID string. The champion
+    name index is built too, since StaticData holds one.
+    '''
+    champions = dict(snapshot['champions'])
+    champions.update(dict((value['key'].lower(), value)
+        for value in snapshot['champions'].values()))
+    index = plugin.ChampionIndex([plugin.Champion(it)
+        for it in snapshot['champions'].values()])
+    return champions, snapshot['spells'], index
+
+def get_size(function):
+    '''
+    Returns the number of bytes still allocated by what function returns.
+    '''
+    tracemalloc.start()
+    result = function()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compares the lookup cost "
+            "and resident size of the static data against the dictionaries "
+            "it replaced, on the names of a full 10 player match.")
+    parser.add_argument('--number', type=int, default=100000,
+            help="matches looked up per repeat")
+    parser.add_argument('--repeat', type=int, default=5)
+    arguments = parser.parse_args()
+
+    plugin = run.load_plugin()
+    data = fixtures.Fixtures()
+    match = data.match(1001000)[1]
+    members = [(it['championId'], it['spell1Id'], it['spell2Id'])
+            for it in match['participants']]
+
+    def load(): # A fresh snapshot, as if read from static.json
+        return data.static_snapshot()
+    old = get_lookups(plugin, load())
+    new = plugin.StaticData(load())
+
+    def old_names():
+        return [(old[0][str(champion)]['name'], old[1][str(spell1)]['name'],
+            old[1][str(spell2)]['name'])
+            for champion, spell1, spell2 in members]
+
+    def new_names():
+        champions, spells = new.champion_names, new.spell_names
+        return [(champions[champion], spells[spell1], spells[spell2])
+            for champion, spell1, spell2 in members]
+
+    assert old_names() == new_names()
+    tests = [
+        ('dictionaries', old_names, lambda: get_lookups(plugin, load())),
+        ('StaticData', new_names, lambda: plugin.StaticData(load()))]
+    baseline = None
+    for name, function, build in tests:
+        best = min(timeit.repeat(function,
+            number=arguments.number, repeat=arguments.repeat))
+        microseconds = best / arguments.number * 1000000
+        baseline = baseline or microseconds
+        print('{:<16}{:>10.2f} us per match{:>8.2f}x{:>10} bytes'.format(
+            name, microseconds, baseline / microseconds, get_size(build)))
@@ -0,0 +1,69 @@
+import argparse
+import timeit
+
+import fixtures
+import run
+
+def get_rows(static, match):
+    '''
+    Returns the rows of both teams of the verbose match table.
+    '''
+    rows = []
+    for index, member in enumerate(match['participants']):
+        player = match['participantIdentities'][index]['player']
+        stats = member['stats']
+        value = "({0:.1f})".format((stats['kills'] + stats['assists']) /
+                (1 if stats['deaths'] == 0 else stats['deaths']))
+        rows.append(('+' if index == 0 else '', player['summonerName'], '(G2)',
+            static.champion_names[member['championId']],
+            "{0[kills]}/{0[deaths]}/{0[assists]} {1}".format(stats, value),
+            static.spell_names[member['spell1Id']],
+            static.spell_names[member['spell2Id']]))
+    return rows
+
+def concatenate(rows):
+    '''
+    The table as it was built before the shared renderer: one concatenation
+    per cell.
+    '''
+    response = ''
+    for highlight, name, rank, champion, kda, spell1, spell2 in rows:
+        if highlight:
+            response += '+ '
+        else:
+            response += '  '
+        response += ('{}'.format(name)).ljust(17)
+        response += ('{}'.format(rank)).rjust(4) + ' | '
+        response += ('{}'.format(champion)).ljust(13) + '| '
+        response += ('{}'.format(kda)).ljust(22) + '| '
+        response += ('{}'.format(spell1)).ljust(9) + '| '
+        response += ('{}'.format(spell2)).ljust(9) + '|'
+        response += '\n'
+    return response
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compares the shared table "
+            "renderer with per-cell concatenation on a full 10 player "
+            "verbose match table.")
+    parser.add_argument('--number', type=int, default=20000,
+            help="tables rendered per repeat")
+    parser.add_argument('--repeat', type=int, default=5)
+    arguments = parser.parse_args()
+
+    plugin = run.load_plugin()
+    data = fixtures.Fixtures()
+    static = plugin.StaticData(data.static_snapshot())
+    rows = get_rows(static, data.match(1001000)[1])
+    assert concatenate(rows) == plugin.get_table(plugin.match_columns, rows)
+
+    tests = [
+        ('concatenation', lambda: concatenate(rows)),
+        ('get_table', lambda: plugin.get_table(plugin.match_columns, rows))]
+    baseline = None
+    for name, function in tests:
+        best = min(timeit.repeat(function,
+            number=arguments.number, repeat=arguments.repeat))
+        microseconds = best / arguments.number * 1000000
+        baseline = baseline or microseconds
+        print('{:<16}{:>10.2f} us per table{:>8.2f}x'.format(
+            name, microseconds, baseline / microseconds))
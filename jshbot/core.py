@@ -176,12 +176,16 @@ class Bot(discord.Client):
         # 1 - permanent
         # 2 - terminal (deletes itself after 'extra' seconds)
         # 3 - active (pass the reference back to the plugin to edit)
+        #     'extra' is a coroutine function called with the bot and the
+        #     message reference
         # If message_type is >= 1, do not add to the edit dictionary
         # TODO: Add normal message response to the edit dictionary
         
         if response[2] == 2: # Terminal
             await asyncio.sleep(response[3])
             await self.delete_message(message_reference)
+        elif response[2] == 3: # Active
+            asyncio.ensure_future(response[3](self, message_reference))
 
     async def on_ready(self):
         plugins.broadcast_event(self, 0)
@@ -1,22 +1,121 @@
 import discord
 import asyncio
-import requests
+import aiohttp
+import collections
+import os
+import json
 import time
 import random
 import math
+import bisect
+import inspect
+import sys
 
 # Debugging
 import logging
 
-from riotwatcher import RiotWatcher
-from riotwatcher import LoLException, error_429
-
+from jshbot import servers
 from jshbot.exceptions import ErrorTypes, BotException
 
 __version__ = '0.1.3'
 EXCEPTION = 'Riot API plugin'
 uses_configuration = True
 
+trackers = {} # (Region, summoner ID): LiveTracker
+leaderboards = {} # Server ID: Leaderboard
+leaderboard_members = {} # (Region, summoner ID): set of server IDs
+
+regions = { # Region: platform ID
+    'br': 'BR1',
+    'eune': 'EUN1',
+    'euw': 'EUW1',
+    'jp': 'JP1',
+    'kr': 'KR',
+    'lan': 'LA1',
+    'las': 'LA2',
+    'na': 'NA1',
+    'oce': 'OC1',
+    'ru': 'RU',
+    'tr': 'TR1'
+}
+
+queues = { # Queue ID: name
+    0: "Custom",
+    8: "Normal 3v3",
+    2: "Normal",
+    14: "Normal Draft",
+    4: "Dynamic Queue",
+    6: "Dynamic Queue",
+    9: "Ranked 3v3",
+    41: "Ranked 3v3",
+    42: "Ranked 5v5",
+    16: "This Gamemode doesn't even exist anymore",
+    17: "Same with this one",
+    7: "Co-op vs AI",
+    25: "Co-op vs AI",
+    31: "Co-op vs AI",
+    32: "Co-op vs AI",
+    33: "Co-op vs AI",
+    52: "Co-op vs AI (3v3)",
+    61: "Team Builder",
+    65: "ARAM",
+    70: "One For All",
+    72: "Magma Chamber 1v1",
+    73: "Magma Chamber 2v2",
+    75: "Hexakill",
+    76: "URF",
+    83: "Co-op vs AI (URF)",
+    91: "Doom Bots Lv 1",
+    92: "Doom Bots Lv 2",
+    93: "Doom Bots Lv 3",
+    96: "Ascension",
+    98: "Hexakill",
+    100: "Bilgewater",
+    300: "Legend of the Poro King",
+    313: "Bilgewater ARAM",
+    400: "Team Builder",
+    410: "Dynamic Queue"
+}
+
+queue_types = { # Queue type of finished matches: queue ID
+    "CUSTOM": 0,
+    "NORMAL_3x3": 8,
+    "NORMAL_5x5_BLIND": 2,
+    "NORMAL_5x5_DRAFT": 14,
+    "RANKED_SOLO_5x5": 4,
+    "RANKED_PREMADE_5x5*": 6,
+    "RANKED_PREMADE_3x3*": 9,
+    "RANKED_TEAM_3x3": 41,
+    "RANKED_TEAM_5x5": 42,
+    "ODIN_5x5_BLIND": 16,
+    "ODIN_5x5_DRAFT": 17,
+    "BOT_5x5*": 7,
+    "BOT_ODIN_5x5": 25,
+    "BOT_5x5_INTRO": 31,
+    "BOT_5x5_BEGINNER": 32,
+    "BOT_5x5_INTERMEDIATE": 33,
+    "BOT_TT_3x3": 52,
+    "GROUP_FINDER_5x5": 61,
+    "ARAM_5x5": 65,
+    "ONEFORALL_5x5": 70,
+    "FIRSTBLOOD_1x1": 72,
+    "FIRSTBLOOD_2x2": 73,
+    "SR_6x6": 75,
+    "URF_5x5": 76,
+    "BOT_URF_5x5": 83,
+    "NIGHTMARE_BOT_5x5_RANK1": 91,
+    "NIGHTMARE_BOT_5x5_RANK2": 92,
+    "NIGHTMARE_BOT_5x5_RANK5": 93,
+    "ASCENSION_5x5": 96,
+    "HEXAKILL": 98,
+    "BILGEWATER_ARAM_5x5": 100,
+    "KING_PORO_5x5": 300,
+    "COUNTER_PICK": 310,
+    "BILGEWATER_5x5": 313,
+    "TEAM_BUILDER_DRAFT_UNRANKED_5x5": 400,
+    "TEAM_BUILDER_DRAFT_RANKED_5x5": 410
+}
+
 def get_commands():
     '''
     Sets up new commands and shortcuts in the proper syntax.
@@ -27,16 +126,38 @@ def get_commands():
     manual = {}
     
     commands['blitz'] = ([
-        'summoner: ?extra',
-        'match: ?basic',
-        'mastery: ?champion:',
-        'challenge ::::',
-        'chests:'],[
+        'summoner: ?extra ?region:',
+        'match: ?basic ?region:',
+        'mastery: ?champion: ?region:',
+        'challenge ?region: ::::',
+        'chests: ?region:',
+        'watch: ?region:',
+        'unwatch: ?region:',
+        'watchlist',
+        'track: ?region:',
+        'defaultregion:',
+        'bracket ?roundrobin ?seed: ?region: :::+',
+        'history: ?region: #',
+        'stats',
+        'link: ?region:',
+        'unlink',
+        'leaderboard'],[
         ('summoner', 'user', 's', 'i', 'info'),
         ('extra', 'x', 'e', 'verbose', 'detail', 'detailed', 'more'),
         ('basic', 'b', 'simple', 'concise'),
         ('champion', 'c'),
-        ('chests', 'chest', 'box', 'boxes')])
+        ('chests', 'chest', 'box', 'boxes'),
+        ('watchlist', 'watching'),
+        ('track', 'follow', 'live'),
+        ('region', 'r'),
+        ('defaultregion', 'setregion'),
+        ('bracket', 'tournament'),
+        ('roundrobin', 'rr'),
+        ('history', 'h', 'matches', 'recent'),
+        ('stats', 'metrics', 'debug'),
+        ('link', 'register', 'iam'),
+        ('unlink', 'unregister'),
+        ('leaderboard', 'ladder', 'ranking', 'top')])
 
     shortcuts['summoner'] = ('blitz -summoner {}', '^')
     shortcuts['mastery'] = ('blitz -mastery {}', '^')
@@ -57,7 +178,38 @@ def get_commands():
                 'mastery levels, and # of games played (ranked) data against '
                 'each other.'),
             ('-chests <summoner>', 'Gets the available chests for the given '
-                'summoner.')],
+                'summoner.'),
+            ('-watch <summoner>', 'Adds the summoner to the watchlist. Data '
+                'for summoners on the watchlist is kept fresh in the '
+                'background so that lookups are fast. Moderators only.'),
+            ('-unwatch <summoner>', 'Removes the summoner from the '
+                'watchlist. Moderators only.'),
+            ('-watchlist', 'Shows the summoners on the watchlist.'),
+            ('-track <summoner>', 'Posts the current match of the summoner '
+                'and keeps it updated until the game ends.'),
+            ('(-roundrobin) (-seed <number>) -bracket <summoner 1> '
+                '<champion 1> <summoner 2> <champion 2> ...', 'Runs a '
+                'challenge event between any number of summoners. By default '
+                'this is a single elimination bracket seeded by score. The '
+                'same seed gives the same results.'),
+            ('-history <summoner> (<number of matches>)', 'Sums up the '
+                'last ranked matches of the summoner (10 by default): win '
+                'rate, KDA, kill participation, and each champion played. '
+                'Stored matches are shown first, and the rest are added as '
+                'they are fetched.'),
+            ('-stats', 'Shows Riot API request counts, latency, rate limit '
+                'hits and cache hit ratios, and saves them to a JSON file.'),
+            ('-link <summoner>', 'Links you to the summoner on this server, '
+                'which adds them to the leaderboard.'),
+            ('-unlink', 'Removes your linked summoner from this server.'),
+            ('-leaderboard', 'Ranks the summoners linked on this server by '
+                'tier, division and LP. Rankings are kept up to date in the '
+                'background.'),
+            ('-defaultregion <region>', 'Sets the region used by commands '
+                'on this server. Moderators only.'),
+            ('(-region <region>)', 'Can be added to any command that looks '
+                'up a summoner to use a region other than the default one. '
+                'Regions: ' + ', '.join(sorted(regions)) + '.')],
         'shortcuts': [
             ('summoner <arguments>', '-summoner <arguments>'),
             ('challenge <summoner 1> <summoner 2> <champion 1> <champion 2>',
@@ -67,43 +219,961 @@ def get_commands():
 
     return (commands, shortcuts, manual)
 
+class APIError(Exception):
+    '''
+    Raised by the Riot API client when a request does not succeed. The status
+    attribute is the HTTP status code returned by the API.
+    '''
+
+    def __init__(self, status, url):
+        self.status = status
+        self.url = url
+        super().__init__('Status {} from {}'.format(status, url))
+
+class RateLimited(APIError):
+    '''
+    Raised by the rate limiter when a request cannot be sent before its wait
+    deadline. Treated the same as a 429 from the API.
+    '''
+
+    def __init__(self, url, wait):
+        self.wait = wait
+        super().__init__(429, url)
+
+class RateLimiter():
+    '''
+    Client side sliding window rate limiter. Each (requests, seconds) pair in
+    limits gets its own log of send times, mirroring Riot's short and long
+    windows, so no window of that length ever holds more than the given number
+    of requests. Requests are queued in order until every window has room, and
+    are only rejected if they would have to wait longer than max_wait seconds.
+    '''
+
+    def __init__(self, limits, max_wait=10):
+        # Each window is [send times, capacity, seconds]
+        self.windows = [[collections.deque(), count, seconds]
+                for count, seconds in limits]
+        self.max_wait = max_wait
+        self.blocked_until = 0
+        self.queued = 0
+        self.lock = asyncio.Lock()
+        self.stats = {
+            'requests': 0,
+            'delayed': 0,
+            'rejected': 0,
+            'retry_after': 0,
+            'total_wait': 0.0,
+            'longest_wait': 0.0
+        }
+
+    def expire(self, now):
+        for log, capacity, seconds in self.windows:
+            while log and log[0] <= now - seconds:
+                log.popleft()
+
+    def get_delay(self, now, needed=1):
+        '''
+        Returns how many seconds it will take until the given number of
+        requests can be sent without going over any window.
+        '''
+        self.expire(now)
+        delay = max(0, self.blocked_until - now)
+        for log, capacity, seconds in self.windows:
+            # Needing more than a window holds means waiting whole windows
+            extra = (needed - 1) // capacity
+            expired = needed - extra*capacity - (capacity - len(log))
+            wait = extra*seconds
+            if expired > 0:
+                wait += log[expired - 1] + seconds - now
+            delay = max(delay, wait)
+        return delay
+
+    def reject(self, url, wait):
+        self.stats['rejected'] += 1
+        raise RateLimited(url, wait)
+
+    async def acquire(self, url, deadline=None):
+        '''
+        Waits until a request can be sent, then logs it in every window.
+        Raises RateLimited if the deadline would be passed.
+        '''
+        start = time.time()
+        if deadline is None:
+            deadline = start + self.max_wait
+
+        # Fail fast if everyone ahead of us already uses up the deadline
+        estimate = self.get_delay(start, needed=self.queued + 1)
+        if start + estimate > deadline:
+            self.reject(url, estimate)
+
+        self.queued += 1
+        try:
+            try:
+                await asyncio.wait_for(
+                        self.lock.acquire(), max(0, deadline - time.time()))
+            except asyncio.TimeoutError:
+                self.reject(url, deadline - start)
+            try:
+                delay = self.get_delay(time.time())
+                while delay > 0:
+                    if time.time() + delay > deadline:
+                        self.reject(url, delay)
+                    await asyncio.sleep(delay)
+                    delay = self.get_delay(time.time())
+                sent = time.time()
+                for log, capacity, seconds in self.windows:
+                    log.append(sent)
+            finally:
+                self.lock.release()
+        finally:
+            self.queued -= 1
+
+        waited = time.time() - start
+        self.stats['requests'] += 1
+        if waited > 0.001:
+            self.stats['delayed'] += 1
+        self.stats['total_wait'] += waited
+        self.stats['longest_wait'] = max(self.stats['longest_wait'], waited)
+
+    def block(self, seconds):
+        '''
+        Stops all requests from being sent for the given number of seconds.
+        Used to honor the Retry-After header of a 429 response.
+        '''
+        self.stats['retry_after'] += 1
+        self.blocked_until = max(self.blocked_until, time.time() + seconds)
+
+    def update(self, headers):
+        '''
+        Synchronizes the windows with the X-Rate-Limit-Count header, which
+        looks like "7:10,100:600" (requests used:window seconds). Requests
+        that Riot counted but were not logged here (sent before a restart, or
+        by another process) are logged as sent now, so they hold their place
+        until a full window has passed.
+        '''
+        counts = headers.get('X-Rate-Limit-Count')
+        if not counts:
+            return
+        now = time.time()
+        self.expire(now)
+        for pair in counts.split(','):
+            try:
+                used, seconds = (int(it) for it in pair.split(':'))
+            except ValueError:
+                continue
+            for log, capacity, window in self.windows:
+                if window == seconds:
+                    log.extend([now] * min(used - len(log), capacity))
+
+    def has_spare(self, reserve=0.5):
+        '''
+        Returns True if nothing is queued and every window has more than the
+        reserve fraction of its capacity available. Background work checks
+        this so that it never competes with commands for budget.
+        '''
+        now = time.time()
+        if self.queued or now < self.blocked_until:
+            return False
+        self.expire(now)
+        return all(capacity - len(log) >= capacity*reserve + 1
+                for log, capacity, seconds in self.windows)
+
+    def get_stats(self):
+        '''
+        Returns a dictionary of the current queue depth and wait times.
+        '''
+        stats = dict(self.stats)
+        stats['queued'] = self.queued
+        stats['average_wait'] = (
+                stats['total_wait'] / stats['requests'] if stats['requests']
+                else 0.0)
+        return stats
+
+class Metrics():
+    '''
+    Riot API request metrics, shared by the clients of every region. Requests
+    are counted by endpoint, with their status codes and a histogram of their
+    latency in milliseconds. Requests rejected by the rate limiter are only
+    counted, since they never reach the API. Also counts how often a command
+    was turned away with the API cooldown message.
+    '''
+
+    buckets = [25, 50, 100, 250, 500, 1000, 2500, 5000] # Upper bounds in ms
+
+    endpoints = [ # Endpoint name: part of the request URL
+        ('summoner', '/v1.4/summoner/'),
+        ('league', '/v2.5/league/'),
+        ('match_list', '/v2.2/matchlist/'),
+        ('match', '/v2.2/match/'),
+        ('current_game', '/getSpectatorGameInfo/'),
+        ('ranked_stats', '/v1.3/stats/'),
+        ('mastery', '/championmastery/'),
+        ('static_data', '/static-data/')]
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = {} # Endpoint name: request metrics
+        self.cooldowns = 0
+
+    def get_endpoint(self, url):
+        for name, part in self.endpoints:
+            if part in url:
+                return name
+        return 'other'
+
+    def record(self, url, status, seconds):
+        '''
+        Records a request to the given URL. Status is the HTTP status code, or
+        'limited' if the rate limiter rejected it, or 'error' if no response
+        was received.
+        '''
+        endpoint = self.get_endpoint(url)
+        entry = self.requests.get(endpoint)
+        if entry is None:
+            entry = self.requests[endpoint] = {
+                'calls': 0,
+                'timed': 0, # Calls that were sent, so have a latency
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'statuses': {},
+                'histogram': [0] * (len(self.buckets) + 1)
+            }
+        status = str(status)
+        entry['calls'] += 1
+        entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+        if status == 'limited':
+            return
+        milliseconds = seconds * 1000
+        entry['timed'] += 1
+        entry['total_ms'] += milliseconds
+        entry['max_ms'] = max(entry['max_ms'], milliseconds)
+        entry['histogram'][bisect.bisect_left(self.buckets, milliseconds)] += 1
+
+    def get_percentile(self, endpoint, percentile):
+        '''
+        Returns the upper bound in milliseconds of the histogram bucket that
+        holds the given percentile of the endpoint's latency.
+        '''
+        entry = self.requests[endpoint]
+        if not entry['timed']:
+            return 0
+        needed = entry['timed'] * percentile / 100
+        count = 0
+        for index, value in enumerate(entry['histogram']):
+            count += value
+            if count >= needed:
+                break
+        if index < len(self.buckets):
+            return self.buckets[index]
+        return entry['max_ms']
+
+    def get_stats(self, clients):
+        '''
+        Returns the request metrics, and by region, the rate limiter and
+        connection stats and the hits and misses of the caches of the given
+        clients.
+        '''
+        caches = {}
+        limiters = {}
+        connections = {}
+        for region, client in clients.items():
+            limiters[region] = client.limiter.get_stats()
+            connections[region] = client.get_connection_stats()
+            caches[region] = dict((name, {
+                    'hits': cache.hits,
+                    'misses': cache.misses
+                }) for name, cache in client.get_caches().items())
+            caches[region]['coalesced'] = {'hits': client.coalesced,
+                    'misses': client.sent}
+        return {
+            'uptime': time.time() - self.started,
+            'cooldowns': self.cooldowns,
+            'buckets': self.buckets,
+            'requests': self.requests,
+            'limiters': limiters,
+            'connections': connections,
+            'caches': caches
+        }
+
+metrics = Metrics()
+
+class Cache():
+    '''
+    Bounded in-memory cache. Entries expire ttl seconds after they are stored,
+    and the least recently used entry is evicted once max_size is reached.
+    Expired entries are kept until they are stale_ttl seconds old, so that
+    they can still be served when the API cannot be reached.
+    '''
+
+    def __init__(self, max_size=1000, ttl=600, stale_ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = ttl if stale_ttl is None else max(ttl, stale_ttl)
+        self.entries = collections.OrderedDict() # key: (stored time, value)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        try:
+            stored, value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        age = time.time() - stored
+        if age > self.ttl: # Expired
+            if age > self.stale_ttl:
+                del self.entries[key]
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def get_stale(self, key):
+        '''
+        Returns a tuple of the entry and its age in seconds, even if it has
+        expired, or None if it is not in the cache or is too stale to serve.
+        '''
+        try:
+            stored, value = self.entries[key]
+        except KeyError:
+            return None
+        age = time.time() - stored
+        if age > self.stale_ttl:
+            return None
+        return (value, age)
+
+    def get_age(self, key):
+        '''
+        Returns how many seconds ago the entry was stored, or None if it is
+        not in the cache.
+        '''
+        if key in self.entries:
+            return time.time() - self.entries[key][0]
+
+    def set(self, key, value):
+        self.entries[key] = (time.time(), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def remove(self, key):
+        self.entries.pop(key, None)
+
+    def __len__(self):
+        return len(self.entries)
+
+class MatchStore():
+    '''
+    Persistent on-disk store of finished matches, keyed by match ID. Each match
+    is saved as its own JSON file, and an index of file sizes and last access
+    times is kept so that the least recently used matches can be evicted once
+    the store grows past max_size bytes.
+    '''
+
+    def __init__(self, directory, max_size=100*1024*1024):
+        self.directory = directory
+        self.max_size = max_size
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.index_path = directory + '/index.json'
+        try:
+            with open(self.index_path, 'r') as index_file:
+                self.index = json.load(index_file)
+        except FileNotFoundError:
+            self.index = self.build_index()
+        except Exception as e:
+            logging.warn("Rebuilding the match index: " + str(e))
+            self.index = self.build_index()
+        self.size = sum(entry[0] for entry in self.index.values())
+        self.hits = 0
+        self.misses = 0
+
+    def build_index(self):
+        '''
+        Builds the index from the match files in the directory.
+        '''
+        index = {}
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith('.json') and file_name != 'index.json':
+                stats = os.stat(self.directory + '/' + file_name)
+                index[file_name[:-5]] = [stats.st_size, stats.st_mtime]
+        return index
+
+    def save_index(self):
+        with open(self.index_path, 'w') as index_file:
+            json.dump(self.index, index_file)
+
+    def get(self, match_id):
+        '''
+        Returns the stored match, or None if it is not in the store.
+        '''
+        match_id = str(match_id)
+        if match_id not in self.index:
+            self.misses += 1
+            return None
+        try:
+            with open(self.directory + '/' + match_id + '.json') as match_file:
+                match = json.load(match_file)
+        except Exception as e:
+            logging.warn("Failed to load match {}: {}".format(match_id, e))
+            self.remove(match_id)
+            self.misses += 1
+            return None
+        self.index[match_id][1] = time.time() # Saved with the next write
+        self.hits += 1
+        return match
+
+    def set(self, match_id, match):
+        match_id = str(match_id)
+        data = json.dumps(match)
+        with open(self.directory + '/' + match_id + '.json', 'w') as match_file:
+            match_file.write(data)
+        if match_id in self.index:
+            self.size -= self.index[match_id][0]
+        self.index[match_id] = [len(data), time.time()]
+        self.size += len(data)
+
+        # Evict least recently used matches until we are under the limit
+        if self.size > self.max_size:
+            by_access = sorted(self.index, key=lambda key: self.index[key][1])
+            for key in by_access:
+                if self.size <= self.max_size or key == match_id:
+                    break
+                self.remove(key, save=False)
+        self.save_index()
+
+    def remove(self, match_id, save=True):
+        entry = self.index.pop(str(match_id), None)
+        if entry is None:
+            return
+        self.size -= entry[0]
+        try:
+            os.remove(self.directory + '/' + str(match_id) + '.json')
+        except OSError:
+            pass
+        if save:
+            self.save_index()
+
+def normalize_name(name):
+    '''
+    Returns the summoner name the way Riot standardizes it: lowercase with all
+    whitespace removed.
+    '''
+    return ''.join(name.split()).lower()
+
+class PooledConnector(aiohttp.TCPConnector):
+    '''
+    Keep-alive connection pool that counts how many new connections it opens,
+    so that connection reuse can be reported.
+    The per host limit needs aiohttp 2.0 or newer, and is left out on the older
+    versions that discord.py 0.x pins, where only the total limit applies.
+    '''
+
+    per_host = 'limit_per_host' in inspect.signature(
+            aiohttp.TCPConnector.__init__).parameters
+
+    def __init__(self, *args, limit_per_host=0, **kwargs):
+        if self.per_host:
+            kwargs['limit_per_host'] = limit_per_host
+        super().__init__(*args, **kwargs)
+        self.opened = 0
+
+    async def _create_connection(self, *args, **kwargs):
+        self.opened += 1
+        return await super()._create_connection(*args, **kwargs)
+
+class RiotClient():
+    '''
+    Asynchronous client for the Riot API. Every endpoint that the plugin uses
+    is covered here, and all requests go through a single aiohttp session with
+    a pool of keep-alive connections, so commands never block the event loop
+    and rarely pay for a new TCP and TLS handshake.
+    Requests other than static data go through the rate limiter.
+    Summoners are cached by ID, with an index of normalized names to IDs.
+    Finished matches are kept in the match store if one is given, and league
+    lookups are batched and cached by the league service. Full mastery lists,
+    match lists and ranked stats are also cached for a short time.
+    '''
+
+    base_url = 'https://{region}.api.pvp.net'
+    global_url = 'https://global.api.pvp.net'
+
+    def __init__(self, key, region='na', platform='NA1',
+            limits=((10, 10), (500, 600)), max_wait=10,
+            cache_size=1000, cache_ttl=600, match_store=None,
+            pool_size=20, pool_per_host=10, keepalive_timeout=60,
+            league_ttl=300, mastery_ttl=600, match_list_ttl=60,
+            ranked_stats_ttl=600, stale_ttl=3600, stale_timeout=2,
+            base_url=None, global_url=None):
+        self.key = key
+        self.region = region
+        self.platform = platform
+        if base_url: # Pointed somewhere else, like the benchmark stand-in
+            self.base_url = base_url
+        if global_url:
+            self.global_url = global_url
+        self.limiter = RateLimiter(limits, max_wait=max_wait)
+        self.summoners = Cache(
+                max_size=cache_size, ttl=cache_ttl, stale_ttl=stale_ttl)
+        self.summoner_names = Cache(
+                max_size=cache_size, ttl=cache_ttl, stale_ttl=stale_ttl)
+        self.match_store = match_store
+        self.leagues = LeagueService(self, max_size=cache_size, ttl=league_ttl,
+                stale_ttl=stale_ttl)
+        self.mastery = Cache(
+                max_size=cache_size, ttl=mastery_ttl, stale_ttl=stale_ttl)
+        self.match_lists = Cache(
+                max_size=cache_size, ttl=match_list_ttl, stale_ttl=stale_ttl)
+        self.ranked_stats = Cache(
+                max_size=cache_size, ttl=ranked_stats_ttl, stale_ttl=stale_ttl)
+        self.stale_timeout = stale_timeout
+        self.revalidating = set() # Keys of stale entries being refreshed
+        self.in_flight = {}
+        self.coalesced = 0
+        self.sent = 0
+        self.connector = PooledConnector(limit=pool_size,
+                limit_per_host=pool_per_host,
+                keepalive_timeout=keepalive_timeout)
+        self.session = aiohttp.ClientSession(connector=self.connector)
+
+    async def warm_up(self, connections=2):
+        '''
+        Opens the given number of connections to each API host ahead of time
+        so that the first commands do not have to wait on handshakes.
+        '''
+        hosts = (self.base_url.format(region=self.region), self.global_url)
+        async def connect(host):
+            self.sent += 1
+            try:
+                async with self.session.head(host) as r:
+                    await r.release()
+            except Exception as e:
+                logging.warn("Failed to warm up {}: {}".format(host, e))
+        await asyncio.gather(*[connect(host)
+            for host in hosts for it in range(connections)])
+
+    def get_caches(self):
+        '''
+        Returns the caches of this client by name.
+        '''
+        caches = {
+            'summoners': self.summoners,
+            'summoner_names': self.summoner_names,
+            'leagues': self.leagues.cache,
+            'mastery': self.mastery,
+            'match_lists': self.match_lists,
+            'ranked_stats': self.ranked_stats
+        }
+        if self.match_store:
+            caches['matches'] = self.match_store
+        return caches
+
+    def get_connection_stats(self):
+        '''
+        Returns how many requests were sent, how many connections were opened
+        for them, and the fraction of requests that reused a connection.
+        '''
+        reused = max(0, self.sent - self.connector.opened)
+        return {
+            'requests': self.sent,
+            'connections': self.connector.opened,
+            'reused': reused,
+            'reuse_ratio': reused / self.sent if self.sent else 0.0
+        }
+
+    async def request(self, url, static=False, **parameters):
+        '''
+        Requests the given endpoint and returns the decoded JSON. Identical
+        requests that are already in flight are not sent again; every caller
+        awaits the same response instead.
+        '''
+        key = (url, static, tuple(sorted(parameters.items())))
+        future = self.in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self.send(url, static, parameters))
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shielded so that one cancelled caller does not cancel the others
+        return await asyncio.shield(future)
+
+    async def send(self, url, static, parameters):
+        '''
+        Sends the request and returns the decoded JSON. Returns None if the API
+        responds with no content. Raises an APIError otherwise. A 429 response
+        is retried after Retry-After seconds if that still fits within the wait
+        deadline.
+        '''
+        if static:
+            url = self.global_url + url
+        else:
+            url = self.base_url.format(region=self.region) + url
+        parameters['api_key'] = self.key
+        deadline = time.time() + self.limiter.max_wait
+        while True:
+            if not static:
+                try:
+                    await self.limiter.acquire(url, deadline=deadline)
+                except RateLimited:
+                    metrics.record(url, 'limited', 0)
+                    raise
+            self.sent += 1
+            start, received = time.time(), False
+            try:
+                async with self.session.get(url, params=parameters) as r:
+                    metrics.record(url, r.status, time.time() - start)
+                    received = True
+                    if r.status == 429:
+                        retry_after = float(r.headers.get('Retry-After', 1))
+                        self.limiter.block(retry_after)
+                        if not static and time.time() + retry_after < deadline:
+                            continue
+                        raise APIError(r.status, url)
+                    if not static:
+                        self.limiter.update(r.headers)
+                    if r.status == 204: # No content (unplayed mastery)
+                        return None
+                    elif r.status != 200:
+                        raise APIError(r.status, url)
+                    return await r.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if not received:
+                    metrics.record(url, 'error', time.time() - start)
+                raise
+
+    async def get_summoner(self, name=None, _id=None):
+        if name is not None:
+            standardized = normalize_name(name)
+            result = await self.request(
+                    '/api/lol/{}/v1.4/summoner/by-name/{}'.format(
+                        self.region, standardized))
+            return result[standardized]
+        else:
+            result = await self.request('/api/lol/{}/v1.4/summoner/{}'.format(
+                self.region, _id))
+            return result[str(_id)]
+
+    def get_cached_summoner(self, name):
+        '''
+        Returns the cached summoner with the given name, or None.
+        '''
+        summoner_id = self.summoner_names.get(normalize_name(name))
+        if summoner_id is not None:
+            return self.summoners.get(summoner_id)
+
+    def get_stale_summoner(self, name):
+        '''
+        Returns a tuple of the cached summoner with the given name and its age,
+        even if it has expired, or None.
+        '''
+        summoner_id = self.summoner_names.get_stale(normalize_name(name))
+        if summoner_id is not None:
+            return self.summoners.get_stale(summoner_id[0])
+
+    def mark_stale(self, age):
+        pass # Only request contexts report stale answers to the user
+
+    def mark_live_unchecked(self):
+        pass
+
+    def cache_summoner(self, summoner):
+        self.summoners.set(summoner['id'], summoner)
+        self.summoner_names.set(
+                normalize_name(summoner['name']), summoner['id'])
+
+    async def get_league_entry(self, summoner_ids):
+        return await self.request(
+                '/api/lol/{}/v2.5/league/by-summoner/{}/entry'.format(
+                    self.region, ','.join(str(it) for it in summoner_ids)))
+
+    async def get_match_list(self, summoner_id):
+        return await self.request(
+                '/api/lol/{}/v2.2/matchlist/by-summoner/{}'.format(
+                    self.region, summoner_id))
+
+    async def get_match(self, match_id):
+        return await self.request('/api/lol/{}/v2.2/match/{}'.format(
+            self.region, match_id))
+
+    async def get_current_game(self, summoner_id):
+        return await self.request(('/observer-mode/rest/consumer/'
+            'getSpectatorGameInfo/{}/{}').format(self.platform, summoner_id))
+
+    async def get_ranked_stats(self, summoner_id):
+        return await self.request(
+                '/api/lol/{}/v1.3/stats/by-summoner/{}/ranked'.format(
+                    self.region, summoner_id))
+
+    async def get_mastery(self, summoner_id, top=True, champion_id=None):
+        if champion_id:
+            endpoint = 'champion/{}'.format(champion_id)
+        else:
+            endpoint = 'topchampions' if top else 'champions'
+        return await self.request(
+                '/championmastery/location/{}/player/{}/{}'.format(
+                    self.platform, summoner_id, endpoint))
+
+    async def static_get_champion_list(self, data_by_id=False):
+        return await self.request(
+                '/api/lol/static-data/{}/v1.2/champion'.format(self.region),
+                static=True, dataById=str(data_by_id).lower())
+
+    async def static_get_summoner_spell_list(self, data_by_id=False):
+        return await self.request(
+                '/api/lol/static-data/{}/v1.2/summoner-spell'.format(
+                    self.region), static=True, dataById=str(data_by_id).lower())
+
+    async def static_get_versions(self):
+        return await self.request(
+                '/api/lol/static-data/{}/v1.2/versions'.format(self.region),
+                static=True)
+
+class LeagueService():
+    '''
+    Batched and cached league entry lookups. Summoner IDs requested at about
+    the same time are collected and sent together, up to batch_size IDs per
+    request. Each summoner's entries are cached for ttl seconds, including
+    summoners that have no entries (not ranked). Stale entries are served if
+    the API is throttled or slow.
+    '''
+
+    batch_size = 10 # Maximum IDs accepted by the league entry endpoint
+
+    def __init__(self, client, max_size=1000, ttl=300, stale_ttl=None,
+            batch_delay=0.01):
+        self.client = client
+        self.cache = Cache(max_size=max_size, ttl=ttl, stale_ttl=stale_ttl)
+        self.batch_delay = batch_delay
+        self.futures = {} # Summoner ID: future of their entries
+        self.queued = []
+        self.flush_handle = None
+
+    async def get(self, summoner_ids, client=None, force=False):
+        '''
+        Returns a dictionary of summoner ID strings to their list of league
+        entries. Summoners that have not played ranked are left out. Stale
+        answers are reported to the given client (or request context). If
+        force is True, every entry is fetched again, and errors are raised
+        instead of serving stale entries. Cached entries are kept until the
+        new ones arrive.
+        '''
+        client = client or self.client
+        leagues = {}
+        waiting = {}
+        for summoner_id in summoner_ids:
+            key = str(summoner_id)
+            entries = None if force else self.cache.get(key)
+            if entries is not None:
+                if entries:
+                    leagues[key] = entries
+                continue
+            if key not in self.futures: # Queue for the next batch
+                self.futures[key] = asyncio.Future()
+                self.queued.append(key)
+            waiting[key] = self.futures[key]
+
+        if self.queued and self.flush_handle is None:
+            self.flush_handle = asyncio.get_event_loop().call_later(
+                    self.batch_delay, self.flush)
+        keys = list(waiting)
+        results = await asyncio.gather(*[get_fresh_or_stale(client,
+                ('league', key), None if force else self.cache.get_stale(key),
+                lambda future=waiting[key]: asyncio.shield(future),
+                refresh=lambda key=key: self.refresh(key))
+            for key in keys], return_exceptions=True)
+        for key, entries in zip(keys, results):
+            if isinstance(entries, BaseException): # All results retrieved
+                raise entries
+            if entries:
+                leagues[key] = entries
+        return leagues
+
+    async def refresh(self, key):
+        try:
+            leagues = await self.client.get_league_entry([key])
+        except APIError as e:
+            if e.status != 404:
+                raise
+            leagues = {} # Not ranked
+        self.set(key, leagues.get(key, []))
+
+    def set(self, key, entries):
+        '''
+        Caches the fetched entries and moves the summoner on any leaderboard
+        they are linked to.
+        '''
+        self.cache.set(key, entries)
+        update_leaderboards(self.client.region, key, entries)
+
+    def flush(self):
+        '''
+        Sends all queued summoner IDs in batches.
+        '''
+        self.flush_handle = None
+        queued, self.queued = self.queued, []
+        for index in range(0, len(queued), self.batch_size):
+            asyncio.ensure_future(
+                    self.fetch(queued[index:index + self.batch_size]))
+
+    async def fetch(self, batch):
+        try:
+            leagues = await self.client.get_league_entry(batch)
+        except APIError as e:
+            if e.status != 404: # Only a 404 means nobody is ranked
+                for key in batch:
+                    self.futures.pop(key).set_exception(e)
+                return
+            leagues = {} # Nobody in the batch has played ranked
+        except Exception as e:
+            for key in batch:
+                self.futures.pop(key).set_exception(e)
+            return
+        for key in batch:
+            entries = leagues.get(key, [])
+            self.set(key, entries)
+            self.futures.pop(key).set_result(entries)
+
+class RequestContext():
+    '''
+    Request-scoped view of the client for a single command. It is passed to
+    the helpers in place of the client, and memoizes every response for as
+    long as the command runs, so no resource is fetched twice by one command.
+    Anything else (caches, the match store, the league service) is passed
+    through to the client.
+    '''
+
+    get_summoner = RiotClient.get_summoner
+    get_league_entry = RiotClient.get_league_entry
+    get_match_list = RiotClient.get_match_list
+    get_match = RiotClient.get_match
+    get_current_game = RiotClient.get_current_game
+    get_ranked_stats = RiotClient.get_ranked_stats
+    get_mastery = RiotClient.get_mastery
+
+    def __init__(self, client):
+        self.client = client
+        self.responses = {} # Request key: future of the response
+        self.stale_age = None # Age of the oldest stale answer used
+        self.live_unchecked = False # The live game lookup did not finish
+
+    def mark_stale(self, age):
+        self.stale_age = max(self.stale_age or 0, age)
+
+    def mark_live_unchecked(self):
+        self.live_unchecked = True
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def request(self, url, static=False, **parameters):
+        key = (url, static, tuple(sorted(parameters.items())))
+        if key not in self.responses:
+            future = asyncio.ensure_future(
+                    self.client.request(url, static=static, **parameters))
+            self.responses[key] = future
+            def forget_failure(future):
+                if future.cancelled() or future.exception():
+                    self.responses.pop(key, None) # So revalidation can retry
+            future.add_done_callback(forget_failure)
+        return await asyncio.shield(self.responses[key])
+
 def api_cooldown():
+    metrics.cooldowns += 1
     raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
             "API is being used too often right now. Please try again later.")
 
-def get_summoner_wrapper(watcher, name):
+async def get_fresh_or_stale(client, key, stale, fetch, refresh=None):
+    '''
+    Returns the result of fetch, which also refreshes the cache. Stale is a
+    tuple of the expired cached value and its age, or None. If there is a
+    stale value and the API is throttled, or fetch takes longer than the
+    client's stale timeout, the stale value is returned right away and its age
+    is marked on the client. The fetch then finishes in the background, or if
+    it was throttled, refresh (or fetch) is run once there is spare budget.
+    '''
+    if stale is None:
+        return await fetch()
+    task = asyncio.ensure_future(fetch())
+    try:
+        return await asyncio.wait_for(
+                asyncio.shield(task), client.stale_timeout)
+    except asyncio.TimeoutError: # Let it finish, and ignore its result
+        task.add_done_callback(lambda it: it.cancelled() or it.exception())
+    except APIError as e:
+        if e.status != 429:
+            raise
+        asyncio.ensure_future(revalidate(client, key, refresh or fetch))
+    client.mark_stale(stale[1])
+    return stale[0]
+
+async def revalidate(client, key, refresh):
+    '''
+    Refreshes a stale cache entry once the rate limiter has spare budget.
+    '''
+    if key in client.revalidating:
+        return
+    client.revalidating.add(key)
+    try:
+        await wait_for_spare(client, 0)
+        await refresh()
+    except Exception as e:
+        logging.warn("Failed to revalidate {}: {}".format(key, e))
+    finally:
+        client.revalidating.discard(key)
+
+async def get_summoner_wrapper(client, name):
     '''
     Wraps the obtaining of a summoner information with exception handling.
+    Summoners that were looked up recently are served from the cache, and
+    expired ones are served if the API is throttled or slow.
     '''
+    summoner = client.get_cached_summoner(name)
+    if summoner:
+        return summoner
+    async def fetch():
+        summoner = await client.get_summoner(name=name)
+        client.cache_summoner(summoner)
+        return summoner
     try:
-        summoner = watcher.get_summoner(name=name)
-    except LoLException as e:
-        if e == error_429:
+        return await get_fresh_or_stale(client,
+                ('summoner', normalize_name(name)),
+                client.get_stale_summoner(name), fetch)
+    except APIError as e:
+        if e.status == 429:
             api_cooldown()
         else:
             try: # Maybe we were given an ID
-                summoner = watcher.get_summoner(_id=name)
+                summoner = await client.get_summoner(_id=name)
             except Exception as e:
                 raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
                         "Summoner \"" + name + "\" not found.", e=e)
     except Exception as e:
         raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
                 "Failed to retrieve summoner information.", e=e)
+    client.cache_summoner(summoner)
     return summoner
 
-def get_league_wrapper(watcher, summoner_ids):
+async def get_league_wrapper(client, summoner_ids, force=False):
     '''
     Wraps the obtaining of a league with exception handling. Returns an empty
-    dictionary if the summoner has not played any ranked games.
+    dictionary if the summoner has not played any ranked games. Lookups go
+    through the league service, so they are batched and cached. Force skips
+    the cache, but keeps the cached entries until the new ones arrive.
     '''
     try:
         if type(summoner_ids) is list:
-            return watcher.get_league_entry(summoner_ids=summoner_ids)
+            return await client.leagues.get(summoner_ids, client, force=force)
         else:
-            league = watcher.get_league_entry(summoner_ids=[summoner_ids])
-            return league[str(summoner_ids)][0]
-    except LoLException as e:
-        if e == error_429:
+            leagues = await client.leagues.get(
+                    [summoner_ids], client, force=force)
+            if str(summoner_ids) not in leagues:
+                logging.warn("Summoner has not played ranked.")
+                return {}
+            return leagues[str(summoner_ids)][0]
+    except APIError as e:
+        if e.status == 429:
             api_cooldown()
         else:
             logging.warn("Summoner has not played ranked.")
@@ -112,15 +1182,25 @@ def get_league_wrapper(watcher, summoner_ids):
         raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
                 "Failed to retrieve summoner league.", e=e)
 
-def get_match_list_wrapper(watcher, summoner_id):
+async def get_match_list_wrapper(client, summoner_id, force=False):
     '''
     Gets the match list of the summoner. Returns an empty list if there are no
-    matches.
+    matches. An expired match list is served if the API is throttled or slow.
+    Force skips the cache, but keeps the cached list until the new one arrives.
     '''
+    match_list = None if force else client.match_lists.get(summoner_id)
+    if match_list is not None:
+        return match_list
+    async def fetch():
+        match_list = (await client.get_match_list(summoner_id))['matches']
+        client.match_lists.set(summoner_id, match_list)
+        return match_list
     try: # TODO: Convert to recent game instead, but the API is so different
-        return watcher.get_match_list(summoner_id)['matches']
+        stale = None if force else client.match_lists.get_stale(summoner_id)
+        return await get_fresh_or_stale(
+                client, ('match_list', summoner_id), stale, fetch)
     except Exception as e:
-        if e == error_429:
+        if isinstance(e, APIError) and e.status == 429:
             api_cooldown()
         else:
             logging.warn("Summoner has no match list.")
@@ -143,61 +1223,115 @@ def get_recent_match(match_list, no_team=False):
                 return match['matchId']
         return None # No suitable match was found
 
-def get_match_wrapper(watcher, match_id):
+async def get_match_wrapper(client, match_id):
     '''
-    Gets the match given match_id. Includes exception handling.
+    Gets the match given match_id. Includes exception handling. Matches are
+    finished, so they never change and are kept in the match store.
     '''
+    store = client.match_store
+    if store and match_id is not None:
+        match = store.get(match_id)
+        if match:
+            return match
     try:
-        return watcher.get_match(match_id)
-    except LoLException as e:
-        if e == error_429:
+        match = await client.get_match(match_id)
+    except APIError as e:
+        if e.status == 429:
             api_cooldown()
         return None
+    if store and match:
+        store.set(match_id, match)
+    return match
 
-def get_current_match_wrapper(watcher, summoner_id):
+async def get_current_match_wrapper(client, summoner_id):
     '''
     Returns the current match if there is one, otherwise returns None.
     '''
     try:
-        return watcher.get_current_game(summoner_id)
-    except LoLException as e:
-        if e == error_429:
+        return await client.get_current_game(summoner_id)
+    except APIError as e:
+        if e.status == 429:
             api_cooldown()
         return None
 
-def get_mastery_wrapper(bot, summoner_id, top=True, champion_id=None):
+async def get_mastery_wrapper(client, summoner_id, top=True, champion_id=None,
+        force=False):
     '''
     Returns the current player mastery if it exists, otherwise returns None.
     If champion_id is specified, this gets mastery data about that specific
-    champion.
-    '''
-    region1 = 'na'
-    region2 = 'NA1'
-    api_key = bot.configurations['discrank.py']['token']
-    if champion_id:
-        champion = '/{}'.format(champion_id)
-        top=False
-    else:
-        champion = 's'
-    url = ('https://{region1}.api.pvp.net/championmastery/location/{region2}/'
-        'player/{player}/{top}champion{champion}?api_key={key}').format(
-            region1=region1, region2=region2, player=summoner_id, 
-            top=('top' if top else ''), champion=champion, key=api_key)
-    r = requests.get(url)
+    champion. Full mastery lists are cached, and any request that can be
+    answered from a cached list is, including expired lists if the API is
+    throttled or slow. Force skips the cache, but keeps the cached list until
+    the new one arrives.
+    '''
+    def select(mastery):
+        if champion_id:
+            for champion_mastery in mastery:
+                if champion_mastery['championId'] == champion_id:
+                    return champion_mastery
+            return None
+        return mastery[:3] if top else mastery
+
+    mastery = None if force else client.mastery.get(summoner_id)
+    if mastery is not None:
+        return select(mastery)
+    async def fetch():
+        mastery = await client.get_mastery(
+                summoner_id, top=top, champion_id=champion_id)
+        if not (top or champion_id) and mastery is not None:
+            client.mastery.set(summoner_id, mastery)
+        return mastery
+    async def refresh(): # The full list answers every kind of request
+        client.mastery.set(summoner_id,
+                await client.get_mastery(summoner_id, top=False))
+    stale = None if force else client.mastery.get_stale(summoner_id)
+    if stale is not None:
+        stale = (select(stale[0]), stale[1])
     try:
-        result = r.json()
-    except:
-        return None
-    if 'status' in result:
-        error_code = result['status']['status_code']
-        if error_code == 429:
+        return await get_fresh_or_stale(client, ('mastery', summoner_id),
+                stale, fetch, refresh=refresh)
+    except APIError as e:
+        if e.status == 429:
             api_cooldown()
         else:
-            logging.error("This is the requests result: " + str(result))
-            raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION, 
+            logging.error("Mastery request failed: " + str(e))
+            raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
                     "Failed to retrieve mastery data.")
-    else:
-        return result
+    except ValueError: # Response was not JSON
+        return None
+
+table_formats = {} # (Columns, widths): row format
+
+def get_table(columns, rows, limit=2000):
+    '''
+    Returns the rows as the lines of a fixed-width table. Columns is a list of
+    (width, alignment, separator) tuples, where alignment is '<' or '>' and
+    the separator follows the column. A width of None fits the widest value
+    in that column. The row format is built once, and rows that would go past
+    the character limit (2000 is the Discord message limit) are left out and
+    counted in a final line instead.
+    '''
+    widths = tuple(
+        max([len(str(row[index])) for row in rows] or [0])
+        if width is None else width
+        for index, (width, alignment, separator) in enumerate(columns))
+    key = (tuple(columns), widths)
+    row_format = table_formats.get(key)
+    if row_format is None:
+        row_format = ''.join('{{{0}:{1}{2}}}{3}'.format(index, column[1],
+            width or '', column[2].replace('{', '{{').replace('}', '}}'))
+            for index, (width, column) in enumerate(zip(widths, columns)))
+        table_formats[key] = row_format
+    lines = [row_format.format(*row) for row in rows]
+
+    total = sum(len(line) + 1 for line in lines)
+    if total > limit:
+        omitted = '... and {} more\n'
+        total += len(omitted)
+        while lines and total > limit:
+            total -= len(lines.pop()) + 1
+        return '\n'.join(lines + [omitted.format(len(rows) - len(lines))])
+    return '\n'.join(lines) + '\n'
 
 def get_top_champions(static, mastery):
     '''
@@ -208,16 +1342,14 @@ def get_top_champions(static, mastery):
         return None
     champions = ''
     for x in range(3):
-        champion_id = str(mastery[x]['championId'])
-        champions += static[1][champion_id]['name'] + ', '
+        champions += static.champion_names[mastery[x]['championId']] + ', '
     return champions[:-2] if champions else None
 
 def get_mastery_details(static, mastery):
     '''
     Returns a string of details for the given mastery.
     '''
-    champion_id = str(mastery['championId'])
-    champion_name = static[1][champion_id]['name']
+    champion_name = static.champion_names[mastery['championId']]
     return ('{0}:\n'
         '\tPoints: {1[championPoints]}\n'
         '\tLevel: {1[championLevel]}\n'
@@ -243,28 +1375,64 @@ def get_participant(match, summoner_id, finished):
                 participant['participantId'] = index + 1
                 return participant
 
-def get_champion_kda(watcher, summoner_id, champion_id):
+class ChampionStats():
+    '''
+    The ranked stats of a summoner on one champion that the plugin uses.
+    '''
+    __slots__ = ('games', 'kills', 'deaths', 'assists')
+
+    def __init__(self, stats):
+        self.games = stats['totalSessionsPlayed']
+        self.kills = stats['totalChampionKills']
+        self.deaths = stats['totalDeathsPerSession'] # Actually the total
+        self.assists = stats['totalAssists']
+
+async def get_ranked_stats_wrapper(client, summoner_id):
+    '''
+    Returns the ranked stats of the summoner as a dictionary of champion IDs
+    to ChampionStats, which is empty if the summoner has no ranked stats. The
+    dictionary is cached, and an expired one is served if the API is
+    throttled or slow.
+    '''
+    champions = client.ranked_stats.get(summoner_id)
+    if champions is not None:
+        return champions
+    async def fetch():
+        try:
+            stats = await client.get_ranked_stats(summoner_id)
+        except APIError as e:
+            if e.status != 404:
+                raise
+            stats = {'champions': []} # No ranked games this season
+        champions = dict((entry['id'], ChampionStats(entry['stats']))
+                for entry in stats['champions'])
+        client.ranked_stats.set(summoner_id, champions)
+        return champions
+    try:
+        return await get_fresh_or_stale(client, ('ranked_stats', summoner_id),
+                client.ranked_stats.get_stale(summoner_id), fetch)
+    except APIError as e:
+        if e.status == 429:
+            api_cooldown()
+        else:
+            return {}
+
+async def get_champion_kda(client, summoner_id, champion_id):
     '''
     Returns a string of the given summoner's KDA of the given champion. If the
     stats cannot be retrieved, return '0/0/0 (0)', or 'API Limit' if the API is
     being rate limited.
     '''
     try:
-        stats = watcher.get_ranked_stats(summoner_id)
-    except LoLException as e:
-        if e == error_429:
-            return 'API Limit'
-        else: # Champion data not found
-            return '0/0/0 (0)'
-    for champion in stats['champions']:
-        if champion['id'] == champion_id:
-            break
-    sessions = champion['stats']['totalSessionsPlayed']
-    if sessions == 0:
+        champions = await get_ranked_stats_wrapper(client, summoner_id)
+    except BotException: # Rate limited
+        return 'API Limit'
+    champion = champions.get(champion_id)
+    if champion is None or champion.games == 0:
         return '0/0/0 (0)'
-    kills = champion['stats']['totalChampionKills'] / sessions
-    deaths = champion['stats']['totalDeathsPerSession'] / sessions
-    assists = champion['stats']['totalAssists'] / sessions
+    kills = champion.kills / champion.games
+    deaths = champion.deaths / champion.games
+    assists = champion.assists / champion.games
     value = (kills + assists) / (1 if deaths == 0 else deaths)
     return "{0:.1f}/{1:.1f}/{2:.1f} ({3:.1f})".format(
             kills, deaths, assists, value)
@@ -290,19 +1458,39 @@ def get_bans(static, match, team, finished=True):
     if finished:
         ban_list = match['teams'][int((team/100) - 1)]['bans']
         for it in range(3):
-            bans.append(static[1][str(ban_list[it]['championId'])]['name'])
+            bans.append(static.champion_names[ban_list[it]['championId']])
     else:
         for ban in match['bannedChampions']:
             if ban['teamId'] == team:
-                bans.append(static[1][str(ban['championId'])]['name'])
+                bans.append(static.champion_names[ban['championId']])
     return bans
 
 
-def get_match_table(static, match, mastery, summoner_id, finished=True, 
-        verbose=False):
+def get_match_table_fields(finished, verbose):
+    '''
+    Returns the set of fetched data that the match table shows, so that only
+    that data is requested. Ranks are only shown in the verbose table, mastery
+    only in the basic one, and KDA is fetched from ranked stats for live games.
+    '''
+    fields = set()
+    if verbose:
+        fields.add('ranks')
+    else:
+        fields.add('mastery')
+    if not finished:
+        fields.add('kda')
+    return fields
+
+# Highlight, summoner, rank, champion, KDA, and summoner spells
+match_columns = [(2, '<', ''), (17, '<', ''), (4, '>', ' | '), (13, '<', '| '),
+        (22, '<', '| '), (9, '<', '| '), (9, '<', '|')]
+
+async def get_match_table(static, client, match, mastery, summoner_id,
+        finished=True, verbose=False):
     '''
     Returns a scoreboard view of the given match. Values differ depending on
-    whether or not the match is finished.
+    whether or not the match is finished. If mastery is None, only the mastery
+    of the summoner's champion is fetched, and only if the view shows it.
     '''
 
     # For rank stuff later
@@ -319,28 +1507,53 @@ def get_match_table(static, match, mastery, summoner_id, finished=True,
 
     # Get game type and also time if the game is not finished
     if finished:
-        queue_id = static[3][match['queueType']]
+        game = static.get_queue_name(match['queueType'])
         game_length_key = 'matchDuration'
     else:
-        try:
-            queue_id = str(match['gameQueueConfigId'])
-        except KeyError:
-            queue_id = '0'
+        game = static.get_queue_name(match.get('gameQueueConfigId', 0))
         game_length_key = 'gameLength'
     total_length = int(match[game_length_key]) + 180
     minutes = str(int(total_length/60))
     seconds = "{0:02d}".format(total_length % 60)
-    game = static[3][queue_id]
+
+    fields = get_match_table_fields(finished, verbose)
+    tasks = {}
 
     # Get ranking for each player
-    summoners = []
-    for index, member in enumerate(match['participants']):
-        if finished:
-            summoner = match['participantIdentities'][index]
-            summoners.append(summoner['player']['summonerId'])
-        else:
-            summoners.append(member['summonerId'])
-    league_data = get_league_wrapper(static[0], summoners)
+    if 'ranks' in fields:
+        summoners = []
+        for index, member in enumerate(match['participants']):
+            if finished:
+                summoner = match['participantIdentities'][index]
+                summoners.append(summoner['player']['summonerId'])
+            else:
+                summoners.append(member['summonerId'])
+        tasks['ranks'] = get_league_wrapper(client, summoners)
+
+    # Live games need the KDA of each shown player from their ranked stats
+    members = match['participants'] if verbose else [participant]
+    if 'kda' in fields:
+        for index, member in enumerate(members):
+            tasks[index] = get_champion_kda(
+                    client, member['summonerId'], member['championId'])
+
+    # Mastery of the summoner's champion if we were not given all of it
+    if 'mastery' in fields and mastery is None:
+        tasks['mastery'] = get_mastery_wrapper(client, summoner_id,
+                champion_id=participant['championId'])
+
+    # Fetch everything at once. Failures become placeholders in the table
+    keys = list(tasks)
+    values = await asyncio.gather(
+            *[tasks[key] for key in keys], return_exceptions=True)
+    results = {}
+    for key, value in zip(keys, values):
+        if isinstance(value, Exception):
+            logging.warn("Failed to get match table data: " + str(value))
+            value = None
+        results[key] = value
+    league_data = results.get('ranks') or {}
+    kdas = [results.get(index) or '?/?/? (?)' for index in range(len(members))]
 
     # Very detailed table
     if verbose:
@@ -385,6 +1598,7 @@ def get_match_table(static, match, mastery, summoner_id, finished=True,
                     'KDA                   | Spell 1  | Spell 2  |\n'
                     '------------------------|--------------|-'
                     '----------------------|----------|----------|\n')
+            rows = []
             for index, member in enumerate(match['participants']):
                 if member['teamId'] != team: # Continue
                     continue
@@ -407,9 +1621,9 @@ def get_match_table(static, match, mastery, summoner_id, finished=True,
                     rank = ''
 
                 # Get champion name and spell names
-                champion = static[1][str(member['championId'])]['name']
-                spell1 = static[2][str(member['spell1Id'])]['name']
-                spell2 = static[2][str(member['spell2Id'])]['name']
+                champion = static.champion_names[member['championId']]
+                spell1 = static.spell_names[member['spell1Id']]
+                spell2 = static.spell_names[member['spell2Id']]
                 
                 # Get KDA
                 if finished: # Pull from participant data
@@ -421,25 +1635,18 @@ def get_match_table(static, match, mastery, summoner_id, finished=True,
                     kda = "{0[kills]}/{0[deaths]}/{0[assists]} {1}".format(
                             stats, value)
                 else:
-                    kda = get_champion_kda(static[0], member['summonerId'],
-                            member['championId'])
+                    kda = kdas[index]
 
                 # Highlight summoner if this is the one we're looking for
                 if index == participant['participantId'] - 1:
-                    response += '+ '
+                    highlight = '+'
                 else:
-                    response += '  '
-
-                # Add champion name, kda, and spells
-                response += ('{}'.format(summoner_name)).ljust(17)
-                response += ('{}'.format(rank)).rjust(4) + ' | '
-                response += ('{}'.format(champion)).ljust(13) + '| '
-                response += ('{}'.format(kda)).ljust(22) + '| '
-                response += ('{}'.format(spell1)).ljust(9) + '| '
-                response += ('{}'.format(spell2)).ljust(9) + '|'
-                response += '\n'
+                    highlight = ''
 
-            response += '\n'
+                rows.append((highlight, summoner_name, rank, champion, kda,
+                    spell1, spell2))
+
+            response += get_table(match_columns, rows) + '\n'
 
         response += '\n```\n'
 
@@ -453,20 +1660,28 @@ def get_match_table(static, match, mastery, summoner_id, finished=True,
             value = "({0:.1f})".format(((stats['kills'] + stats['assists']) / 
                     (1 if stats['deaths'] == 0 else stats['deaths'])))
             kda = "{0[kills]}/{0[deaths]}/{0[assists]} {1}".format(stats, value)
-        else: # Pull from league data
-            kda = get_champion_kda(static[0], summoner_id, champion_id)
+        else: # Pull from ranked stats
+            kda = kdas[0]
 
         # Get spell names
-        spell1 = static[2][str(participant['spell1Id'])]['name']
-        spell2 = static[2][str(participant['spell2Id'])]['name']
-        champion = static[1][str(champion_id)]['name']
+        spell1 = static.spell_names[participant['spell1Id']]
+        spell2 = static.spell_names[participant['spell2Id']]
+        champion = static.champion_names[champion_id]
 
         # Get mastery data
-        for champion_mastery in mastery:
-            if champion_mastery['championId'] == champion_id:
-                break
-        mastery_data = "({0[championPoints]}|{0[championLevel]})".format(
-                champion_mastery)
+        if mastery is None:
+            champion_mastery = results.get('mastery')
+        else:
+            for champion_mastery in mastery:
+                if champion_mastery['championId'] == champion_id:
+                    break
+            else: # Champion has not been played
+                champion_mastery = None
+        if champion_mastery:
+            mastery_data = "({0[championPoints]}|{0[championLevel]})".format(
+                    champion_mastery)
+        else:
+            mastery_data = "(0|0)"
 
         # Format response
         if finished:
@@ -487,35 +1702,108 @@ def get_match_table(static, match, mastery, summoner_id, finished=True,
 
     return response
 
-def get_match_table_wrapper(bot, static, watcher, name, verbose=False):
+async def run_graph(steps):
     '''
-    Gets the match table. Makes the calling method easier to look at.
+    Runs a small dependency graph. Steps is a dictionary of step names to a
+    tuple of (coroutine function, dependency names). Each step is started as
+    soon as its dependencies are done, and is called with their results as
+    keyword arguments. Returns a dictionary of step names to results.
     '''
+    futures = {}
 
-    summoner = get_summoner_wrapper(watcher, name)
-    mastery = get_mastery_wrapper(bot, summoner['id'], top=False)
+    async def run(name):
+        function, dependencies = steps[name]
+        values = {}
+        for dependency in dependencies:
+            values[dependency] = await futures[dependency]
+        return await function(**values)
 
-    # Get last match or current match information
-    match = get_current_match_wrapper(watcher, summoner['id'])
-    currently_playing = bool(match)
-    if not currently_playing: # Get most recent match
-        match_list = get_match_list_wrapper(watcher, summoner['id'])
+    for name in steps:
+        futures[name] = asyncio.ensure_future(run(name))
+    try:
+        await asyncio.gather(*futures.values())
+    except:
+        for future in futures.values():
+            future.cancel()
+        raise
+    return dict((name, future.result()) for name, future in futures.items())
+
+def get_summoner_steps(client, name):
+    '''
+    Returns the dependency graph steps shared by the summoner and match
+    commands. Only the summoner lookup is a real dependency, so everything
+    else starts as soon as the summoner ID is known. The match list is
+    fetched alongside the current game instead of after it.
+    '''
+
+    async def summoner():
+        return await get_summoner_wrapper(client, name)
+
+    async def mastery(summoner):
+        return await get_mastery_wrapper(client, summoner['id'], top=False)
+
+    async def current(summoner):
+        try: # Live games are not cached, so show the last match instead
+            return await asyncio.wait_for(
+                    client.get_current_game(summoner['id']),
+                    client.stale_timeout)
+        except APIError as e:
+            if e.status == 429:
+                client.mark_live_unchecked()
+            return None # Otherwise not in a game
+        except asyncio.TimeoutError:
+            client.mark_live_unchecked()
+            return None
+
+    async def match_list(summoner):
+        return await get_match_list_wrapper(client, summoner['id'])
+
+    async def match(current, match_list):
+        if current:
+            return current
         recent_match = get_recent_match(match_list, no_team=True)
-        match = get_match_wrapper(watcher, recent_match)
+        if recent_match is None:
+            return None
+        return await get_match_wrapper(client, recent_match)
+
+    return {
+        'summoner': (summoner, ()),
+        'mastery': (mastery, ('summoner',)),
+        'current': (current, ('summoner',)),
+        'match_list': (match_list, ('summoner',)),
+        'match': (match, ('current', 'match_list'))
+    }
+
+async def get_match_table_wrapper(static, client, name, verbose=False):
+    '''
+    Gets the match table. Makes the calling method easier to look at.
+    '''
+    steps = get_summoner_steps(client, name)
+    del steps['mastery'] # The table only fetches the mastery that it shows
+    results = await run_graph(steps)
+    match = results['match']
+    currently_playing = bool(results['current'])
 
     # If a suitable match was found, get the information
     if match:
-        return get_match_table(static, match, mastery, summoner['id'],
-                finished=(not currently_playing), verbose=verbose)
+        return await get_match_table(static, client, match, None,
+                results['summoner']['id'], finished=(not currently_playing),
+                verbose=verbose)
     else:
         return "A most recent match was not found..."
 
-def get_summoner_information(bot, static, watcher, name, verbose=False):
+async def get_summoner_information(static, client, name, verbose=False):
     '''
     Returns a nicely formatted string of information about the given summoner.
     '''
-    summoner = get_summoner_wrapper(watcher, name)
-    mastery = get_mastery_wrapper(bot, summoner['id'], top=False)
+    steps = get_summoner_steps(client, name)
+
+    async def league(summoner):
+        return await get_league_wrapper(client, summoner['id'])
+
+    steps['league'] = (league, ('summoner',))
+    results = await run_graph(steps)
+    summoner, mastery = results['summoner'], results['mastery']
     response = ("***`{0[name]}`***\n"
         "**Summoner ID:** {0[id]}\n"
         "**Level:** {0[summonerLevel]}\n"
@@ -523,7 +1811,7 @@ def get_summoner_information(bot, static, watcher, name, verbose=False):
                 summoner, get_top_champions(static, mastery))
 
     # Get league information
-    league = get_league_wrapper(watcher, summoner['id'])
+    league = results['league']
     if league:
 
         # Extra champion mastery data if we want extra information
@@ -549,29 +1837,29 @@ def get_summoner_information(bot, static, watcher, name, verbose=False):
         response += "This summoner has not played ranked yet this season...\n"
 
     # Get last match or current match information
-    match = get_current_match_wrapper(watcher, summoner['id'])
-    currently_playing = bool(match)
-    if not currently_playing: # Get most recent match
-        match_list = get_match_list_wrapper(watcher, summoner['id'])
-        recent_match = get_recent_match(match_list, no_team=True)
-        match = get_match_wrapper(watcher, recent_match)
+    match = results['match']
+    currently_playing = bool(results['current'])
 
     # If a suitable match was found, get the information
     if match:
         response += "***`{} Match`***\n".format(
                 'Current' if currently_playing else 'Last')
-        response += get_match_table(static, match, mastery, summoner['id'],
-                finished=(not currently_playing), verbose=False)
+        response += await get_match_table(static, client, match, mastery,
+                summoner['id'], finished=(not currently_playing), verbose=False)
     else:
         response += "A most recent match was not found...\n"
 
     return response
 
+# Champion, points, level, chest, highest grade, and last played
+mastery_columns = [(14, '<', '| '), (10, '<', '| '), (4, '<', '| '),
+        (4, '<', '| '), (6, '<', '| '), (0, '<', '')]
+
 def get_formatted_mastery_data(static, champion_data):
     '''
-    Returns a formatted string of the given champion mastery data.
+    Returns a row of the mastery table for the given champion mastery data.
     '''
-    champion_name = static[1][str(champion_data['championId'])]['name']
+    champion_name = static.champion_names[champion_data['championId']]
     chest = 'Yes' if champion_data['chestGranted'] else 'No'
     if 'lastPlayTime' in champion_data:
         last_played = time.time() - champion_data['lastPlayTime']/1000
@@ -582,31 +1870,28 @@ def get_formatted_mastery_data(static, champion_data):
         highest_grade = champion_data['highestGrade']
     else:
         highest_grade = 'n/a'
-    response = '{}'.format(champion_name).ljust(14) + '| '
-    response += '{0[championPoints]}'.format(champion_data).ljust(10) + '| '
-    response += '{0[championLevel]}'.format(champion_data).ljust(4) + '| '
-    response += '{}'.format(chest).ljust(4) + '| '
-    response += '{}'.format(highest_grade).ljust(6) + '| '
-    response += '{}'.format(last_played)
-    return response + '\n'
+    return (champion_name, champion_data['championPoints'],
+            champion_data['championLevel'], chest, highest_grade, last_played)
 
-def get_mastery_table(bot, static, watcher, name, champion=None):
+async def get_mastery_table(static, client, name, champion=None):
     '''
     Gets mastery information for the given summoner. If the champion argument
     is specified, it will find the details of that champion only.
     The table generated will be the top 10 champions of the summoner.
     '''
-    summoner = get_summoner_wrapper(watcher, name)
+    summoner = await get_summoner_wrapper(client, name)
     if champion:
-        try:
-            champion_id = static[1][champion.replace(' ', '').lower()]['id']
-            champion_data = get_mastery_wrapper(bot, summoner['id'], 
-                    champion_id=champion_id)
-        except KeyError:
-            raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
-                    "Champion not found.")
+        champion = find_champion(static, champion)
+        champion_data = await get_mastery_wrapper(client, summoner['id'],
+                champion_id=champion.id)
+        if not champion_data: # Never played, or no content from the API
+            return "{} has no mastery on {}.".format(
+                    summoner['name'], champion.name)
     else:
-        champion_data = get_mastery_wrapper(bot, summoner['id'], top=False)
+        champion_data = await get_mastery_wrapper(
+                client, summoner['id'], top=False)
+        if not champion_data:
+            return "{} has no mastery data.".format(summoner['name'])
     
     labels = '#  | Champion      | Points    | Lvl | Box | Grade | Last Played '
     line = '---|---------------|-----------|-----|-----|-------|-------------'
@@ -618,131 +1903,1262 @@ def get_mastery_table(bot, static, watcher, name, champion=None):
     response = '```\n{}\n{}\n'.format(labels, line)
 
     if champion:
-        response += get_formatted_mastery_data(static, champion_data)
+        response += get_table(mastery_columns,
+                [get_formatted_mastery_data(static, champion_data)])
     else:
-        for it in range(10):
-            response += '{}'.format(it + 1).ljust(3) + '| '
-            response += get_formatted_mastery_data(static, champion_data[it])
+        rows = [(index + 1,) + get_formatted_mastery_data(static, data)
+                for index, data in enumerate(champion_data[:10])]
+        response += get_table([(3, '<', '| ')] + mastery_columns, rows)
     return response + '```'
 
-def get_ranked_stats_wrapper(watcher, summoner_id):
+def get_challenge_score(points, level, games):
     '''
-    Returns the ranked stats with error checking. Returns None if the stats
-    do not exist.
+    Returns the challenge score of a champion from its mastery points, mastery
+    level, and ranked games played.
     '''
-    try:
-        return watcher.get_ranked_stats(summoner_id)
-    except LoLException as e:
-        if e == error_429:
-            api_cooldown()
-        else:
-            return None
+    return level * math.log1p(games) * math.log1p(points)
 
-def get_challenge_result(bot, static, watcher, arguments):
+async def get_challenge_entrant(static, client, name, champion):
+    '''
+    Returns a tuple of the summoner name, champion name, and challenge score
+    of the given summoner playing the given champion. The ranked stats and the
+    mastery of the champion are fetched at the same time.
+    '''
+    champion = find_champion(static, champion)
+    summoner = await get_summoner_wrapper(client, name)
+    stats, data = await asyncio.gather(
+            get_ranked_stats_wrapper(client, summoner['id']),
+            get_mastery_wrapper(
+                client, summoner['id'], champion_id=champion.id))
+
+    # Get ranked stats for total games played on the champion
+    games = stats[champion.id].games if champion.id in stats else 0
+    if not games or games == 1:
+        games = math.e
+
+    # Get champion mastery data for the champion
+    if data:
+        points, level = data['championPoints'], data['championLevel']
+    else: # No mastery data on this champion
+        points, level = math.e, 1
+
+    return (summoner['name'], champion.name,
+            get_challenge_score(points, level, games))
+
+async def get_challenge_result(static, client, arguments):
     '''
     This returns a result of the challenge minigame. The minigame consists of
     pitting two summoners' champions' mastery values against each other. 
     '''
+    entrants = await asyncio.gather(
+            get_challenge_entrant(static, client, arguments[0], arguments[2]),
+            get_challenge_entrant(static, client, arguments[1], arguments[3]))
+    names = [entrant[0] for entrant in entrants]
+    scores = [entrant[2] for entrant in entrants]
+
+    # Calculate chance
+    total = scores[0] + scores[1]
+    response = ("Chance of {0} winning: {1:.2f}%\n"
+        "Chance of {2} winning: {3:.2f}%\n").format(
+                names[0], 100 * scores[0] / total,
+                names[1], 100 * scores[1] / total)
+
+    # Calculate winner
+    random_value = random.random() * total
+    response += 'The RNG gods rolled: {0:.1f}\n'.format(random_value)
+    response += 'The winner is **{}**!'.format(
+            names[0] if random_value < scores[0] else names[1])
 
-    summoners = [arguments[0], arguments[1]]
-    champions = [arguments[2], arguments[3]]
-    games = [0, 0]
-    names = ['', '']
-    ids = [0, 0]
+    return response
 
-    for it in range(2):
+def get_win_probabilities(scores):
+    '''
+    Returns the matrix of the chance that each entrant beats each other
+    entrant, the same way the challenge does: their share of the total score.
+    '''
+    return [[score / (score + other) for other in scores] for score in scores]
 
-        # Get summoner data and champion ID
-        summoners[it] = get_summoner_wrapper(watcher, summoners[it])
-        names[it] = summoners[it]['name']
-        try: # In case the champion isn't valid
-            champions[it] = static[1][champions[it].replace(' ', '').lower()]
-            champions[it] = champions[it]['id']
-        except KeyError:
-            return "Could not find the champion {}.".format(champions[it])
-
-        # Get ranked stats for total games played on each champion
-        ids[it] = summoners[it]['id']
-        summoners[it] = get_ranked_stats_wrapper(watcher, ids[it])
-
-        if summoners[it]:
-            for champion in summoners[it]['champions']:
-                if champion['id'] == champions[it]:
-                    games[it] = champion['stats']['totalSessionsPlayed']
-        if not games[it] or games[it] == 1:
-            games[it] = math.e
-
-        # Get champion mastery data for each champion
-        data = get_mastery_wrapper(bot, ids[it], champion_id=champions[it])
-        if data:
-            champions[it] = (data['championPoints'], data['championLevel'])
-        else: # No mastery data on this champion
-            champions[it] = (math.e, 1)
-
-    # Do the calculation
-    if champions[0][1] and champions[1][1] and games[0] and games[1]:
-
-        # Give approximate chance score
-        scores = [0, 0]
-
-        # Do calculation stuff
-        for it in range(2):
-            scores[it] = (champions[it][1] * math.log1p(games[it]) *
-                math.log1p(champions[it][0]))
-
-        # Calculate chance
-        total = scores[0] + scores[1]
-        response = ("Chance of {0} winning: {1:.2f}%\n"
-            "Chance of {2} winning: {3:.2f}%\n").format(
-                    names[0], 100 * scores[0] / total,
-                    names[1], 100 * scores[1] / total)
-
-        # Calculate winner
-        random_value = random.random() * total
-        response += 'The RNG gods rolled: {0:.1f}\n'.format(random_value)
-        response += 'The winner is **{}**!'.format(
-                names[0] if random_value < scores[0] else names[1])
-
-        return response
+def get_bracket_order(size):
+    '''
+    Returns the seeds (0 is the best) in bracket order for a bracket of the
+    given power of two size, so that the top seeds meet as late as possible.
+    '''
+    order = [0]
+    while len(order) < size:
+        total = len(order) * 2
+        order = [seed for it in order for seed in (it, total - 1 - it)]
+    return order
 
+def get_title_chances(probabilities, slots):
+    '''
+    Returns the chance of each entrant winning the whole bracket. Slots is the
+    bracket order of entrant indices, where None is a bye.
+    '''
+    # Chance of each slot's entrant still being in after each round
+    alive = [[1.0 if it is not None else 0.0] for it in slots]
+    size, level = 1, 0
+    while size < len(slots):
+        for start in range(0, len(slots), size * 2):
+            halves = (range(start, start + size),
+                    range(start + size, start + size * 2))
+            for half, other in (halves, halves[::-1]):
+                for it in half:
+                    if slots[it] is None:
+                        alive[it].append(0.0)
+                        continue
+                    chance, possible = 0.0, 0.0
+                    for opponent in other:
+                        if slots[opponent] is None:
+                            continue
+                        possible += alive[opponent][level]
+                        chance += alive[opponent][level] * (
+                            probabilities[slots[it]][slots[opponent]])
+                    if not possible: # Bye
+                        chance = 1.0
+                    alive[it].append(alive[it][level] * chance)
+        size, level = size * 2, level + 1
+    chances = [0.0] * len(probabilities)
+    for it, entrant in enumerate(slots):
+        if entrant is not None:
+            chances[entrant] = alive[it][-1]
+    return chances
+
+def get_match_winner(rng, probabilities, first, second):
+    if first is None or second is None: # Bye
+        return second if first is None else first
+    return first if rng.random() < probabilities[first][second] else second
+
+async def get_bracket_result(bot, static, client, arguments, seed=None,
+        round_robin=False):
+    '''
+    Runs a challenge event between the given summoner and champion pairs. A
+    bracket is a single elimination tournament seeded by score. A round robin
+    has every entrant play every other entrant once. Uses the same win chances
+    as the challenge, and a seeded RNG so results can be reproduced.
+    '''
+    if len(arguments) % 2:
+        raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                "Every summoner needs a champion.")
+    elif len(arguments) < 4:
+        raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                "An event needs at least two entrants.")
+    limit = bot.configurations['discrank.py'].get('bracket_limit', 64)
+    if len(arguments) // 2 > limit:
+        raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                "Events are limited to {} entrants.".format(limit))
+    if seed is None:
+        seed = random.randint(0, 999999)
     else:
-        return "Something bad happened. Please report!"
-
-def get_chests(bot, static, watcher, name):
+        try:
+            seed = int(seed)
+        except ValueError:
+            raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                    "The seed must be a number.")
+    rng = random.Random(seed)
+
+    entrants = await asyncio.gather(*[
+        get_challenge_entrant(static, client, arguments[it], arguments[it + 1])
+        for it in range(0, len(arguments), 2)])
+    scores = [entrant[2] for entrant in entrants]
+    probabilities = get_win_probabilities(scores)
+    labels = ['{} ({})'.format(name, champion)
+            for name, champion, score in entrants]
+
+    if round_robin:
+        wins = [0] * len(entrants)
+        for first in range(len(entrants)):
+            for second in range(first + 1, len(entrants)):
+                wins[get_match_winner(rng, probabilities, first, second)] += 1
+        expected = [sum(row) - 0.5 for row in probabilities] # Minus self
+        standings = sorted(range(len(entrants)),
+                key=lambda it: (-wins[it], -scores[it]))
+        response = '**Round robin** ({} entrants, seed {})\n```\n'.format(
+                len(entrants), seed)
+        response += '#  | Entrant                        | Wins | Expected\n'
+        response += '---|--------------------------------|------|---------\n'
+        rows = [(place + 1, labels[it], wins[it], '{:.1f}'.format(expected[it]))
+                for place, it in enumerate(standings)]
+        response += get_table([(3, '<', '| '), (31, '<', '| '),
+            (5, '<', '| '), (0, '<', '')], rows, limit=1900 - len(response))
+        return response + '```\nThe winner is **{}**!'.format(
+                entrants[standings[0]][0])
+
+    # Seed by score, then fill the bracket out to a power of two with byes
+    size = 1
+    while size < len(entrants):
+        size *= 2
+    ranking = sorted(range(len(entrants)), key=lambda it: -scores[it])
+    slots = [ranking[seed_index] if seed_index < len(ranking) else None
+            for seed_index in get_bracket_order(size)]
+    chances = get_title_chances(probabilities, slots)
+
+    rounds = []
+    remaining = slots
+    while len(remaining) > 1:
+        remaining = [get_match_winner(rng, probabilities, *remaining[it:it + 2])
+                for it in range(0, len(remaining), 2)]
+        rounds.append(remaining)
+
+    response = '**Bracket** ({} entrants, seed {})\n```\n'.format(
+            len(entrants), seed)
+    response += '#  | Entrant                        | Title | Reached\n'
+    response += '---|--------------------------------|-------|--------\n'
+    rows = []
+    for place, it in enumerate(ranking):
+        reached = sum(1 for winners in rounds if it in winners)
+        if reached == len(rounds):
+            reached = 'Winner'
+        elif reached == len(rounds) - 1:
+            reached = 'Final'
+        else:
+            reached = 'Round {}'.format(reached + 1)
+        rows.append((place + 1, labels[it],
+            '{:.1f}%'.format(100 * chances[it]), reached))
+    response += get_table([(3, '<', '| '), (31, '<', '| '), (6, '<', '| '),
+        (0, '<', '')], rows, limit=1900 - len(response))
+    return response + '```\nThe winner is **{}**!'.format(
+            entrants[rounds[-1][0]][0])
+
+async def get_chests(static, client, name):
     '''
     Returns a formatted string with the list of chests that a summoner has not
     obtained yet through mastery.
     '''
 
     # Get mastery data
-    summoner = get_summoner_wrapper(watcher, name)
-    mastery = get_mastery_wrapper(bot, summoner['id'], top=False)
+    summoner = await get_summoner_wrapper(client, name)
+    mastery = await get_mastery_wrapper(client, summoner['id'], top=False)
     response = ("Here is a list of champions that {} has not received a chest "
             "for:\n").format(summoner['name'])
     champions = []
     for data in mastery: # Look for chests that can be obtained
         if not data['chestGranted']:
-            champion_name = static[1][str(data['championId'])]['name']
+            champion_name = static.champion_names[data['championId']]
             champions.append(champion_name)
     champions.sort()
 
     if not champions:
         return "This summoner has no mastery data."
 
-    # Format the result
-    for it in range(len(champions) % 6):
-        champions.append('') # Fill out the rest with empty strings
-    total_length = len(champions)
-
+    # Format the result as rows of 6, with the last row filled out
+    champions += [''] * (-len(champions) % 6)
+    rows = [champions[it:it + 6] for it in range(0, len(champions), 6)]
     response += '```\n'
-    for it in range(int(total_length/6)):
-        for it2 in range(6):
-            response += '{}'.format(champions[6*it + it2]).ljust(14)
-        response += '\n'
-    response += '```'
+    response += get_table([(14, '<', '')] * 6, rows,
+            limit=2000 - len(response) - 3)
+    return response + '```'
 
+class MatchHistory():
+    '''
+    Running totals over the finished matches of one summoner. Each match adds
+    a row of [games, wins, kills, deaths, assists, team kills] to the overall
+    totals and to the totals of the champion played, so matches can be added
+    as they arrive and the summary rendered at any point.
+    '''
+
+    def __init__(self, summoner_id, name, total):
+        self.summoner_id = summoner_id
+        self.name = name
+        self.total = total
+        self.totals = [0] * 6
+        self.champions = {} # Champion ID: totals
+        self.failed = 0
+
+    def add(self, match):
+        '''
+        Adds the match to the totals. Matches that could not be fetched count
+        as failed.
+        '''
+        if not match:
+            self.failed += 1
+            return
+        for identity in match['participantIdentities']:
+            if identity['player']['summonerId'] == self.summoner_id:
+                participant_id = identity['participantId']
+                break
+        else:
+            self.failed += 1
+            return
+        for participant in match['participants']:
+            if participant['participantId'] == participant_id:
+                break
+        stats = participant['stats']
+        team_kills = sum(it['stats']['kills'] for it in match['participants']
+                if it['teamId'] == participant['teamId'])
+        row = (1, int(stats['winner']), stats['kills'], stats['deaths'],
+                stats['assists'], team_kills)
+        champion = self.champions.setdefault(participant['championId'], [0] * 6)
+        for index, value in enumerate(row):
+            self.totals[index] += value
+            champion[index] += value
+
+    def get_summary(self, totals):
+        '''
+        Returns the win rate, KDA, and kill participation strings of totals.
+        '''
+        games, wins, kills, deaths, assists, team_kills = totals
+        win_rate = '{:.1f}%'.format(100 * wins / games)
+        kda = '{0:.1f}/{1:.1f}/{2:.1f} ({3:.1f})'.format(kills / games,
+                deaths / games, assists / games,
+                (kills + assists) / (deaths or 1))
+        participation = '{:.1f}%'.format(
+                100 * (kills + assists) / (team_kills or 1))
+        return win_rate, kda, participation
+
+    def get_response(self, static):
+        counted = self.totals[0]
+        pending = self.total - counted - self.failed
+        response = '**Last {} matches of {}**'.format(self.total, self.name)
+        if pending:
+            response += ' ({} still loading...)'.format(pending)
+        elif self.failed:
+            response += ' ({} could not be loaded)'.format(self.failed)
+        if not counted:
+            return response + '\nNo matches yet.'
+        win_rate, kda, participation = self.get_summary(self.totals)
+        response += ('\nWin rate: {0} ({1[1]}W {2}L)\nKDA: {3}\n'
+                'Kill participation: {4}\n```\n').format(win_rate,
+                        self.totals, counted - self.totals[1], kda,
+                        participation)
+        response += ('Champion      | Games | Win %  | KDA                   '
+                '| KP\n--------------|-------|--------|-----------------------'
+                '|-------\n')
+        rows = []
+        for champion_id, totals in sorted(self.champions.items(),
+                key=lambda it: (-it[1][0], -it[1][1])):
+            rows.append((static.champion_names[champion_id], totals[0])
+                    + self.get_summary(totals))
+        response += get_table([(14, '<', '| '), (6, '<', '| '),
+            (7, '<', '| '), (22, '<', '| '), (0, '<', '')], rows,
+            limit=1990 - len(response))
+        return response + '```'
+
+async def get_history_response(bot, static, client, name, count):
+    '''
+    Returns a tuple of the match history summary of the last count matches of
+    the given summoner, and a coroutine function that fetches the matches
+    that are not in the match store yet and edits the message with the full
+    summary. The coroutine function is None if every match was stored.
+    '''
+    configuration = bot.configurations['discrank.py']
+    limit = configuration.get('history_limit', 50)
+    try:
+        count = int(count) if count else 10
+    except ValueError:
+        raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                "The number of matches must be a number.")
+    if not 0 < count <= limit:
+        raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                "The number of matches must be between 1 and {}.".format(limit))
+
+    summoner = await get_summoner_wrapper(client, name)
+    match_list = await get_match_list_wrapper(client, summoner['id'])
+    match_ids = [match['matchId'] for match in match_list[:count]]
+    if not match_ids:
+        return ("{} has no ranked matches.".format(summoner['name']), None)
+    history = MatchHistory(summoner['id'], summoner['name'], len(match_ids))
+
+    # Stored matches first, so the first response is immediate
+    missing = []
+    for match_id in match_ids:
+        match = client.match_store.get(match_id) if client.match_store else None
+        if match:
+            history.add(match)
+        else:
+            missing.append(match_id)
+    if client.match_store:
+        client.match_store.save_index()
+    if not missing:
+        return (history.get_response(static), None)
+
+    batch_size = configuration.get('history_batch_size', 5)
+    reserve = configuration.get('history_reserve', 0.2)
+    async def fetch_missing(bot, message):
+        text = history.get_response(static)
+        for start in range(0, len(missing), batch_size):
+            await wait_for_spare(client, reserve) # Leave room for commands
+            matches = await asyncio.gather(*[get_match_wrapper(client, it)
+                for it in missing[start:start + batch_size]],
+                return_exceptions=True)
+            for match in matches:
+                history.add(None if isinstance(match, Exception) else match)
+            previous, text = text, history.get_response(static)
+            if text != previous:
+                try:
+                    await bot.edit_message(message, text)
+                except Exception as e:
+                    logging.warn("Failed to edit the history: " + str(e))
+                    return
+
+    return (history.get_response(static), fetch_missing)
+
+def get_stats_response(bot):
+    '''
+    Returns the Riot API request and cache metrics, and saves all of them to
+    metrics.json in the data directory.
+    '''
+    clients = bot.data['discrank.py']['clients']
+    stats = metrics.get_stats(clients)
+    with open(bot.path + '/data/discrank.py/metrics.json', 'w') as stats_file:
+        json.dump(stats, stats_file, indent=4)
+
+    response = '**Riot API stats** (up {0:.1f} h, {1} cooldowns)\n```\n'.format(
+            stats['uptime'] / 3600, stats['cooldowns'])
+    response += ('Endpoint      | Calls | Avg ms | p90 ms | Max ms | 429s | '
+            'Errors\n--------------|-------|--------|--------|--------|------|'
+            '-------\n')
+    rows = []
+    for endpoint, entry in sorted(stats['requests'].items()):
+        statuses = entry['statuses']
+        throttled = statuses.get('429', 0) + statuses.get('limited', 0)
+        errors = entry['calls'] - throttled - sum( # Not found is an answer
+                statuses.get(it, 0) for it in ('200', '204', '404'))
+        rows.append((endpoint, entry['calls'],
+            '{:.0f}'.format(entry['total_ms'] / max(1, entry['timed'])),
+            '<{:.0f}'.format(metrics.get_percentile(endpoint, 90)),
+            '{:.0f}'.format(entry['max_ms']), throttled, errors))
+    if rows:
+        response += get_table([(14, '<', '| '), (6, '<', '| '),
+            (7, '<', '| '), (7, '<', '| '), (7, '<', '| '), (5, '<', '| '),
+            (0, '<', '')], rows)
+    else:
+        response += 'No requests yet.\n'
+
+    # Caches summed over every region
+    totals = collections.OrderedDict()
+    for caches in stats['caches'].values():
+        for name, cache in caches.items():
+            total = totals.setdefault(name, [0, 0])
+            total[0] += cache['hits']
+            total[1] += cache['misses']
+    response += ('\nCache          | Hits  | Misses | Hit %\n'
+            '---------------|-------|--------|------\n')
+    rows = [(name, hits, misses, '{:.1f}'.format(
+        100 * hits / (hits + misses) if hits + misses else 0))
+        for name, (hits, misses) in totals.items()]
+    response += get_table([(15, '<', '| '), (6, '<', '| '), (7, '<', '| '),
+        (0, '<', '')], rows)
+
+    # Rate limiter queueing and connection reuse of each region
+    response += ('\nRegion | Queued | Delayed | Rejected | Avg wait | Conns | '
+            'Reuse %\n-------|--------|---------|----------|----------|-------|'
+            '--------\n')
+    rows = []
+    for region, limiter in sorted(stats['limiters'].items()):
+        connections = stats['connections'][region]
+        rows.append((region.upper(), limiter['queued'], limiter['delayed'],
+            limiter['rejected'],
+            '{:.0f} ms'.format(limiter['average_wait'] * 1000),
+            connections['connections'],
+            '{:.1f}'.format(100 * connections['reuse_ratio'])))
+    response += get_table([(7, '<', '| '), (7, '<', '| '), (8, '<', '| '),
+        (9, '<', '| '), (9, '<', '| '), (6, '<', '| '), (0, '<', '')], rows)
+    return response + '```\nSaved to data/discrank.py/metrics.json'
+
+def load_regions(bot):
+    '''
+    Returns the dictionary of default regions by server ID from the data
+    directory. It is only read once, when the plugin is ready.
+    '''
+    try:
+        with open(bot.path + '/data/discrank.py/regions.json') as region_file:
+            return json.load(region_file)
+    except FileNotFoundError:
+        return {}
+
+def set_default_region(bot, server, region):
+    '''
+    Sets the default region of the given server.
+    '''
+    region = get_region(region)
+    server_regions = bot.data['discrank.py']['regions']
+    server_regions[server.id] = region
+    with open(bot.path + '/data/discrank.py/regions.json', 'w') as region_file:
+        json.dump(server_regions, region_file, indent=4)
+    return "The default region of this server is now {}.".format(
+            region.upper())
+
+def get_region(region):
+    region = region.lower()
+    if region not in regions:
+        raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                "Invalid region. Regions: " + ', '.join(sorted(regions)))
+    return region
+
+def create_client(bot, region):
+    '''
+    Creates the client of the given region. Every region has its own
+    connection pool, rate limiter, caches, and match store, so that traffic
+    in one region does not slow down another.
+    '''
+    configuration = bot.configurations['discrank.py']
+    client = RiotClient(configuration['token'],
+            region=region, platform=regions[region],
+            limits=configuration.get('rate_limits', ((10, 10), (500, 600))),
+            max_wait=configuration.get('max_wait', 10),
+            cache_size=configuration.get('summoner_cache_size', 1000),
+            cache_ttl=configuration.get('summoner_cache_ttl', 600),
+            match_store=MatchStore(
+                bot.path + '/data/discrank.py/matches/' + region,
+                max_size=configuration.get('match_cache_megabytes', 100) *
+                    1024 * 1024),
+            pool_size=configuration.get('pool_size', 20),
+            pool_per_host=configuration.get('pool_per_host', 10),
+            keepalive_timeout=configuration.get('keepalive_timeout', 60),
+            league_ttl=configuration.get('league_cache_ttl', 300),
+            mastery_ttl=configuration.get('mastery_cache_ttl', 600),
+            match_list_ttl=configuration.get('match_list_cache_ttl', 60),
+            ranked_stats_ttl=configuration.get('ranked_stats_cache_ttl', 600),
+            stale_ttl=configuration.get('stale_cache_ttl', 3600),
+            stale_timeout=configuration.get('stale_timeout', 2),
+            base_url=configuration.get('base_url'),
+            global_url=configuration.get('global_url'))
+    asyncio.ensure_future(client.warm_up(
+        configuration.get('warm_connections', 2)))
+    return client
+
+def get_client(bot, region=None, server=None):
+    '''
+    Returns the client of the given region, creating it on first use. If no
+    region is given, the default region of the server is used, followed by
+    the configured default region.
+    '''
+    if region is None and server is not None:
+        region = bot.data['discrank.py']['regions'].get(server.id)
+    if region is None:
+        region = bot.configurations['discrank.py'].get('region', 'na')
+    region = get_region(region)
+    clients = bot.data['discrank.py']['clients']
+    if region not in clients:
+        clients[region] = create_client(bot, region)
+    return clients[region]
+
+class LiveTracker():
+    '''
+    Follows the live game of one summoner. A single poller serves every
+    message tracking the summoner: it polls the current game, and edits the
+    messages only when the rendered table changes. Polling stops when the
+    game ends or when there are no messages left to edit. Ranked stats do
+    not change during a game, so they are fetched once through the tracker's
+    own request context.
+    '''
+
+    def __init__(self, client, summoner_id, interval):
+        self.client = client
+        self.summoner_id = summoner_id
+        self.interval = interval
+        self.messages = []
+        self.text = ''
+        self.context = RequestContext(client)
+        self.task = None
+
+    async def add(self, bot, message):
+        '''
+        Adds the message to the list of messages to edit. Used as the callback
+        of the active response.
+        '''
+        self.messages.append(message)
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.poll(bot))
+
+    async def edit(self, bot, text):
+        self.text = text
+        for message in list(self.messages):
+            try:
+                await bot.edit_message(message, text)
+            except Exception as e: # Message was probably deleted
+                logging.warn("Failed to edit a tracked message: " + str(e))
+                self.messages.remove(message)
+
+    async def poll(self, bot):
+        try:
+            while self.messages:
+                await asyncio.sleep(self.interval)
+                static = bot.data['discrank.py']['static']
+                # Not the wrapper, since a busy poll is not a cooldown
+                try:
+                    match = await self.client.get_current_game(
+                            self.summoner_id)
+                except APIError as e:
+                    if e.status == 429: # Rate limited, so try again later
+                        continue
+                    match = None
+                if not match:
+                    await self.edit(bot, self.text + "This game has ended.")
+                    break
+                text = await get_match_table(static, self.context, match,
+                        None, self.summoner_id, finished=False, verbose=True)
+                if text != self.text:
+                    await self.edit(bot, text)
+        finally:
+            key = (self.client.region, self.summoner_id)
+            if trackers.get(key) is self:
+                del trackers[key]
+
+async def get_tracker_response(bot, static, client, name):
+    '''
+    Returns a tuple of the live match table of the given summoner and the
+    tracker that will keep it updated, or a message and None if the summoner
+    is not in a game. Summoners that are already tracked are not fetched.
+    '''
+    summoner = await get_summoner_wrapper(client, name)
+    key = (client.region, summoner['id'])
+    tracker = trackers.get(key)
+    if tracker and tracker.text:
+        return (tracker.text, tracker)
+
+    match = await get_current_match_wrapper(client, summoner['id'])
+    if not match:
+        return ("{} is not in a game right now.".format(summoner['name']), None)
+    interval = bot.configurations['discrank.py'].get('track_interval', 60)
+    tracker = LiveTracker(client, summoner['id'], interval)
+    tracker.text = await get_match_table(static, tracker.context, match, None,
+            summoner['id'], finished=False, verbose=True)
+    trackers[key] = tracker
+    return (tracker.text, tracker)
+
+def load_watchlist(bot):
+    '''
+    Returns the list of watched [summoner name, region] pairs from the data
+    directory. Names saved without a region use the configured region.
+    '''
+    try:
+        with open(bot.path + '/data/discrank.py/watchlist.json') as watch_file:
+            watchlist = json.load(watch_file)
+    except FileNotFoundError:
+        return []
+    region = bot.configurations['discrank.py'].get('region', 'na')
+    return [[it, region] if isinstance(it, str) else it for it in watchlist]
+
+def save_watchlist(bot, watchlist):
+    with open(bot.path + '/data/discrank.py/watchlist.json', 'w') as watch_file:
+        json.dump(watchlist, watch_file, indent=4)
+
+async def modify_watchlist(bot, client, name, add):
+    '''
+    Adds or removes the given summoner from the watchlist. The summoner is
+    looked up before the watchlist is read, so that the watchlist is read,
+    changed and saved with no await in between, and changes made at the same
+    time do not overwrite each other.
+    '''
+    limit = bot.configurations['discrank.py'].get('watchlist_limit', 25)
+    if add:
+        if len(load_watchlist(bot)) >= limit: # Before spending a request
+            raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                    "The watchlist is full ({} summoners).".format(limit))
+        summoner = await get_summoner_wrapper(client, name)
+    watchlist = load_watchlist(bot)
+    normalized = [[normalize_name(name), region] for name, region in watchlist]
+    if add:
+        if len(watchlist) >= limit:
+            raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                    "The watchlist is full ({} summoners).".format(limit))
+        if [normalize_name(summoner['name']), client.region] in normalized:
+            raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                    "{} is already on the watchlist.".format(summoner['name']))
+        watchlist.append([summoner['name'], client.region])
+        response = "{} was added to the watchlist.".format(summoner['name'])
+    else:
+        entry = [normalize_name(name), client.region]
+        if entry not in normalized:
+            raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                    "{} is not on the watchlist.".format(name))
+        removed = watchlist.pop(normalized.index(entry))[0]
+        response = "{} was removed from the watchlist.".format(removed)
+    save_watchlist(bot, watchlist)
     return response
 
+def get_watchlist(bot):
+    watchlist = load_watchlist(bot)
+    if not watchlist:
+        return "The watchlist is empty."
+    entries = sorted(watchlist, key=lambda it: (it[1], it[0].lower()))
+    return "Watched summoners:\n" + ', '.join(
+            '{} ({})'.format(name, region.upper()) for name, region in entries)
+
+async def wait_for_spare(client, reserve):
+    while not client.limiter.has_spare(reserve):
+        await asyncio.sleep(1)
+
+async def refresh_summoner(client, name, reserve):
+    '''
+    Refreshes the cached summoner, league, mastery, and recent match data of
+    the given summoner if it is missing or past half of its lifetime. Each
+    request waits for spare rate limit budget first. Cached entries are kept
+    until the new ones arrive, so they can still be served if a refresh is
+    throttled.
+    '''
+    def is_stale(cache, key):
+        age = cache.get_age(key)
+        return age is None or age > cache.ttl / 2
+
+    summoner = client.get_cached_summoner(name)
+    if summoner is None or is_stale(client.summoners, summoner['id']):
+        await wait_for_spare(client, reserve)
+        summoner = await client.get_summoner(name=name)
+        client.cache_summoner(summoner)
+    summoner_id = summoner['id']
+
+    if is_stale(client.leagues.cache, str(summoner_id)):
+        await wait_for_spare(client, reserve)
+        await client.leagues.get([summoner_id], force=True)
+
+    if is_stale(client.mastery, summoner_id):
+        await wait_for_spare(client, reserve)
+        await get_mastery_wrapper(client, summoner_id, top=False, force=True)
+
+    if is_stale(client.match_lists, summoner_id):
+        await wait_for_spare(client, reserve)
+        match_list = await get_match_list_wrapper(
+                client, summoner_id, force=True)
+        recent_match = get_recent_match(match_list, no_team=True)
+        if recent_match is not None:
+            await wait_for_spare(client, reserve)
+            await get_match_wrapper(client, recent_match)
+
+async def refresh_watchlist(bot):
+    '''
+    Background task that keeps the data of watched summoners fresh, using
+    only spare rate limit budget.
+    '''
+    configuration = bot.configurations['discrank.py']
+    interval = configuration.get('watchlist_interval', 120)
+    reserve = configuration.get('watchlist_reserve', 0.5)
+    while True:
+        for name, region in load_watchlist(bot):
+            try:
+                client = get_client(bot, region)
+                await refresh_summoner(client, name, reserve)
+            except Exception as e:
+                logging.warn("Failed to refresh {}: {}".format(name, e))
+        await asyncio.sleep(interval)
+
+class Leaderboard():
+    '''
+    Ranking of the summoners linked on one server by solo queue tier, division
+    and LP. The ranking is a sorted list that is updated in place whenever the
+    league entries of a linked summoner are fetched, so showing it takes no
+    requests and no sorting. Summoners whose entries have not been fetched yet
+    are ranked last.
+    '''
+
+    tiers = ['CHALLENGER', 'MASTER', 'DIAMOND', 'PLATINUM', 'GOLD', 'SILVER',
+            'BRONZE']
+    divisions = ['I', 'II', 'III', 'IV', 'V']
+
+    def __init__(self):
+        self.members = {} # User ID: (region, summoner ID)
+        self.positions = {} # (Region, summoner ID): entry in the ranking
+        self.ranking = [] # (Tier, division, -LP, name, region, ID, row)
+
+    def get_entry(self, region, summoner_id, name, entries):
+        '''
+        Returns the ranking entry of the summoner. Entries is the list of
+        league entries, or None if they have not been fetched yet.
+        '''
+        league = None
+        for it in entries or []:
+            if it['queue'] == 'RANKED_SOLO_5x5':
+                league = it
+        if league is None:
+            rank = 'Unranked' if entries is not None else 'Pending'
+            order = len(self.tiers) + (entries is None)
+            return (order, 0, 0, name.lower(), region, summoner_id,
+                    (name, region.upper(), rank, '', ''))
+        entry = league['entries'][0]
+        name = entry.get('playerOrTeamName', name)
+        tier, division = league['tier'], entry['division']
+        return (self.tiers.index(tier) if tier in self.tiers else
+                    len(self.tiers) - 1,
+                self.divisions.index(division)
+                    if division in self.divisions else 0,
+                -entry['leaguePoints'], name.lower(), region, summoner_id,
+                (name, region.upper(), tier.capitalize() + ' ' + division,
+                    entry['leaguePoints'],
+                    '{0[wins]}/{0[losses]}'.format(entry)))
+
+    def add(self, user_id, region, summoner_id, name, entries=None):
+        self.remove(user_id)
+        self.members[user_id] = (region, summoner_id)
+        self.set((region, summoner_id),
+                self.get_entry(region, summoner_id, name, entries))
+
+    def remove(self, user_id):
+        '''
+        Removes the summoner of the user, and returns their (region, summoner
+        ID) pair, or None if the user had not linked one.
+        '''
+        key = self.members.pop(user_id, None)
+        if key is not None:
+            self.set(key, None)
+        return key
+
+    def update(self, region, summoner_id, entries):
+        key = (region, summoner_id)
+        if key in self.positions:
+            name = self.positions[key][-1][0]
+            self.set(key, self.get_entry(region, summoner_id, name, entries))
+
+    def set(self, key, entry):
+        '''
+        Moves the summoner to the position of the given entry (or out of the
+        ranking if it is None) with a binary search.
+        '''
+        old = self.positions.get(key)
+        if old == entry:
+            return
+        if old is not None:
+            del self.ranking[bisect.bisect_left(self.ranking, old)]
+            del self.positions[key]
+        if entry is not None:
+            bisect.insort(self.ranking, entry)
+            self.positions[key] = entry
+
+    def get_position(self, user_id):
+        '''
+        Returns the 1-based position of the summoner of the given user, or None
+        if the user has not linked one.
+        '''
+        key = self.members.get(user_id)
+        if key is None:
+            return None
+        return bisect.bisect_left(self.ranking, self.positions[key]) + 1
+
+def add_leaderboard_member(server_id, user_id, region, summoner_id, name,
+        entries=None):
+    leaderboard = leaderboards.setdefault(server_id, Leaderboard())
+    remove_leaderboard_member(server_id, user_id)
+    leaderboard.add(user_id, region, summoner_id, name, entries)
+    leaderboard_members.setdefault((region, summoner_id), set()).add(server_id)
+
+def remove_leaderboard_member(server_id, user_id):
+    leaderboard = leaderboards.get(server_id)
+    key = leaderboard.remove(user_id) if leaderboard else None
+    if key is not None:
+        leaderboard_members[key].discard(server_id)
+        if not leaderboard_members[key]:
+            del leaderboard_members[key]
+
+def update_leaderboards(region, summoner_id, entries):
+    '''
+    Moves the summoner on every leaderboard they are linked to. Called by the
+    league service whenever league entries are fetched.
+    '''
+    summoner_id = int(summoner_id)
+    for server_id in leaderboard_members.get((region, summoner_id), ()):
+        leaderboards[server_id].update(region, summoner_id, entries)
+
+def load_links(bot):
+    '''
+    Returns the linked summoners as a dictionary of server IDs to dictionaries
+    of user IDs to [summoner ID, summoner name, region] lists.
+    '''
+    try:
+        with open(bot.path + '/data/discrank.py/links.json') as links_file:
+            return json.load(links_file)
+    except FileNotFoundError:
+        return {}
+
+def save_links(bot, links):
+    with open(bot.path + '/data/discrank.py/links.json', 'w') as links_file:
+        json.dump(links, links_file, indent=4)
+
+def load_leaderboards(bot):
+    '''
+    Builds the leaderboards from the saved links. Their league entries are
+    filled in by the leaderboard refresh.
+    '''
+    for server_id, server_links in load_links(bot).items():
+        for user_id, (summoner_id, name, region) in server_links.items():
+            add_leaderboard_member(server_id, user_id, region, summoner_id,
+                    name)
+
+async def link_summoner(bot, server, user, client, name):
+    '''
+    Links the user to the given summoner on the server, which adds the
+    summoner to the leaderboard of the server. The links are read, checked
+    and saved after every request has finished, so that links made at the
+    same time do not overwrite each other.
+    '''
+    limit = bot.configurations['discrank.py'].get('leaderboard_limit', 500)
+    def check(server_links, summoner=None):
+        if user.id not in server_links and len(server_links) >= limit:
+            raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                    "The leaderboard is full ({} summoners).".format(limit))
+        for user_id, (summoner_id, _, region) in server_links.items():
+            if (summoner and user_id != user.id and
+                    summoner_id == summoner['id'] and region == client.region):
+                raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                        "{} is already linked to someone else on this "
+                        "server.".format(summoner['name']))
+
+    check(load_links(bot).get(server.id, {})) # Before spending any requests
+    summoner = await get_summoner_wrapper(client, name)
+    leagues = await get_league_wrapper(client, [summoner['id']])
+
+    links = load_links(bot)
+    server_links = links.setdefault(server.id, {})
+    check(server_links, summoner)
+    server_links[user.id] = [summoner['id'], summoner['name'], client.region]
+    save_links(bot, links)
+    add_leaderboard_member(server.id, user.id, client.region, summoner['id'],
+            summoner['name'], leagues.get(str(summoner['id']), []))
+    return "{} is now linked to you on this server.".format(summoner['name'])
+
+def unlink_summoner(bot, server, user):
+    links = load_links(bot)
+    server_links = links.get(server.id, {})
+    if user.id not in server_links:
+        raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                "You have not linked a summoner on this server.")
+    name = server_links.pop(user.id)[1]
+    save_links(bot, links)
+    remove_leaderboard_member(server.id, user.id)
+    return "{} is no longer linked to you on this server.".format(name)
+
+# Position, summoner, region, rank, LP, and wins/losses
+leaderboard_columns = [(4, '<', '| '), (17, '<', '| '), (7, '<', '| '),
+        (14, '<', '| '), (4, '<', '| '), (0, '<', '')]
+
+def get_leaderboard_response(bot, server, user):
+    '''
+    Returns the top of the leaderboard of the server, and the position of the
+    user if they are further down.
+    '''
+    leaderboard = leaderboards.get(server.id)
+    if not leaderboard or not leaderboard.ranking:
+        return ("Nobody on this server has linked a summoner yet. Use "
+                "`blitz -link <summoner>` to join the leaderboard.")
+    size = bot.configurations['discrank.py'].get('leaderboard_size', 20)
+    total = len(leaderboard.ranking)
+    response = '**Leaderboard of {}** ({} summoners)\n```\n'.format(
+            server.name, total)
+    response += ('#   | Summoner         | Region | Rank          | LP  | W/L\n'
+            '----|------------------|--------|---------------|-----|------\n')
+    rows = [(index + 1,) + entry[-1]
+            for index, entry in enumerate(leaderboard.ranking[:size])]
+    position = leaderboard.get_position(user.id)
+    footer = '```'
+    if position is not None and position > size:
+        footer += '\nYou are #{} of {}.'.format(position, total)
+    response += get_table(leaderboard_columns, rows,
+            limit=2000 - len(response) - len(footer))
+    return response + footer
+
+async def refresh_leaderboards(bot):
+    '''
+    Background task that refetches the league entries of every linked summoner
+    once they are past half of their lifetime, in batches and using only
+    spare rate limit budget. The league service moves the summoners on the
+    leaderboards as the entries arrive.
+    '''
+    configuration = bot.configurations['discrank.py']
+    interval = configuration.get('leaderboard_interval', 600)
+    reserve = configuration.get('leaderboard_reserve', 0.5)
+    while True:
+        summoners = {} # Region: summoner IDs
+        for region, summoner_id in list(leaderboard_members):
+            summoners.setdefault(region, []).append(summoner_id)
+        for region, summoner_ids in summoners.items():
+            client = get_client(bot, region)
+            cache = client.leagues.cache
+            stale = []
+            for summoner_id in summoner_ids:
+                age = cache.get_age(str(summoner_id))
+                if age is None or age > cache.ttl / 2:
+                    stale.append(summoner_id)
+            batch_size = LeagueService.batch_size
+            for index in range(0, len(stale), batch_size):
+                batch = stale[index:index + batch_size]
+                try:
+                    await wait_for_spare(client, reserve)
+                    await get_league_wrapper(client, batch, force=True)
+                except Exception as e:
+                    logging.warn(
+                            "Failed to refresh leaderboard entries: " + str(e))
+        await asyncio.sleep(interval)
+
+class ChampionIndex():
+    '''
+    Champion name index built once from the static data. Resolves exact names,
+    common abbreviations and initials ("mf", "j4"), unique prefixes of names
+    or of words in names ("cho", "fortune"), and small typos. Ambiguous names
+    resolve to a ranked list of suggestions instead.
+    '''
+
+    aliases = {
+        'gp': 'gangplank',
+        'ww': 'warwick',
+        'j4': 'jarvaniv',
+        'asol': 'aurelionsol',
+        'heimer': 'heimerdinger',
+        'mundo': 'drmundo',
+        'wu': 'monkeyking',
+        'lb': 'leblanc',
+        'kench': 'tahmkench'
+    }
+
+    def __init__(self, champions):
+        self.champions = {} # Normalized name: champion
+        self.masks = {} # Normalized name: bit mask of the letters in it
+        self.results = {} # Query: previous result
+        self.keys = {} # Alias, initials, or key: set of normalized names
+        tokens = set() # (token, rank, normalized name), ranked by relevance
+        for champion in champions:
+            name = self.normalize(champion.name)
+            self.champions[name] = champion
+            self.masks[name] = self.get_mask(name)
+            tokens.add((name, 0, name))
+
+            # Words in the name, like "fortune" for Miss Fortune
+            words = champion.name.replace('.', ' ').split()
+            for word in words[1:]:
+                tokens.add((self.normalize(word), 1, name))
+
+            # Initials, from either the words or the capitals in the key
+            initials = [''.join(word[0] for word in words).lower(),
+                    ''.join(it for it in champion.key if it.isupper())]
+            for key in initials + [champion.key]:
+                key = self.normalize(key)
+                if len(key) > 1 and key != name:
+                    self.keys.setdefault(key, set()).add(name)
+
+        for alias, name in self.aliases.items():
+            if name in self.champions:
+                self.keys[alias] = set([name])
+            else: # Aliases use keys in case the name is different
+                for champion_name, champion in self.champions.items():
+                    if self.normalize(champion.key) == name:
+                        self.keys[alias] = set([champion_name])
+        self.tokens = sorted(tokens)
+
+    def normalize(self, name):
+        return ''.join(it for it in name.lower() if it.isalnum())
+
+    def get_mask(self, name):
+        mask = 0
+        for character in name:
+            mask |= 1 << (ord(character) % 64)
+        return mask
+
+    def get_prefix_matches(self, query):
+        '''
+        Returns the names that have the query as a prefix of the name or of a
+        word in the name, best matches first.
+        '''
+        ranks = {}
+        index = bisect.bisect_left(self.tokens, (query,))
+        while (index < len(self.tokens) and
+                self.tokens[index][0].startswith(query)):
+            token, rank, name = self.tokens[index]
+            ranks[name] = min(rank, ranks.get(name, rank))
+            index += 1
+        return sorted(ranks, key=lambda name: (ranks[name], len(name), name))
+
+    def get_distance(self, first, second, limit):
+        '''
+        Returns the edit distance (with transpositions) between the two
+        strings, or limit + 1 if it is greater than limit.
+        '''
+        if abs(len(first) - len(second)) > limit:
+            return limit + 1
+        last = None
+        previous = list(range(len(second) + 1))
+        for x in range(1, len(first) + 1):
+            character = first[x - 1]
+            current = [x]
+            best = x
+            for y in range(1, len(second) + 1):
+                other = second[y - 1]
+                value = previous[y - 1] + (character != other)
+                if previous[y] < value: # Deletion
+                    value = previous[y] + 1
+                if current[y - 1] < value: # Insertion
+                    value = current[y - 1] + 1
+                if (last and character != other and y > 1 and
+                        character == second[y - 2] and first[x - 2] == other
+                        and last[y - 2] < value): # Transposition
+                    value = last[y - 2] + 1
+                current.append(value)
+                if value < best:
+                    best = value
+            if best > limit: # No way to get back under the limit
+                return limit + 1
+            last, previous = previous, current
+        return previous[-1]
+
+    def get_close_matches(self, query):
+        '''
+        Returns a list of (distance, name) pairs of the names within a small
+        edit distance of the query, closest first. Longer queries are also
+        compared against the start of names that share their first letter.
+        '''
+        limit = 1 if len(query) <= 4 else 2
+        query_mask = self.get_mask(query)
+        matches = []
+        for name in self.champions:
+            # Each letter of the query missing from the name costs an edit
+            if bin(query_mask & ~self.masks[name]).count('1') > limit:
+                distance = limit + 1
+            else:
+                distance = self.get_distance(query, name, limit)
+            if (len(query) > 3 and len(name) > len(query) and
+                    name[0] == query[0]):
+                distance = min(distance,
+                        self.get_distance(query, name[:len(query)], limit))
+            if distance <= limit:
+                matches.append((distance, len(name), name))
+        return [(distance, name) for distance, length, name in sorted(matches)]
+
+    def find(self, query):
+        '''
+        Returns a tuple of the matching champion (or None) and a list of
+        suggested champion names if the query did not resolve to exactly one.
+        '''
+        query = self.normalize(query)
+        if not query:
+            return (None, [])
+        if query in self.champions:
+            return (self.champions[query], [])
+        if query in self.results:
+            return self.results[query]
+        matches = sorted(self.keys.get(query, ()))
+        if not matches:
+            matches = self.get_prefix_matches(query)
+        if not matches:
+            close = self.get_close_matches(query)
+            if len(close) > 1 and close[0][0] < close[1][0]: # Clear winner
+                close = close[:1]
+            matches = [name for distance, name in close]
+        if len(matches) == 1:
+            result = (self.champions[matches[0]], [])
+        else:
+            result = (None,
+                    [self.champions[name].name for name in matches[:5]])
+        if len(self.results) > 1000:
+            self.results.clear()
+        self.results[query] = result
+        return result
+
+def find_champion(static, name):
+    '''
+    Returns the champion with the given champion name. Raises an exception
+    with suggestions if the name could not be resolved to a single champion.
+    '''
+    champion, suggestions = static.champion_index.find(name)
+    if champion:
+        return champion
+    elif suggestions:
+        raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                "Champion \"{}\" is ambiguous. Did you mean: {}?".format(
+                    name, ', '.join(suggestions)))
+    else:
+        raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                "Champion \"{}\" not found.".format(name))
+
+def load_static_snapshot(bot):
+    '''
+    Returns the static data snapshot saved on disk, or None if there is none.
+    '''
+    try:
+        with open(bot.path + '/data/discrank.py/static.json') as static_file:
+            return json.load(static_file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warn("Failed to load the static data snapshot: " + str(e))
+        return None
+
+def save_static_snapshot(bot, snapshot):
+    with open(bot.path + '/data/discrank.py/static.json', 'w') as static_file:
+        json.dump(snapshot, static_file)
+
+async def get_static_snapshot(client, version=None):
+    '''
+    Downloads the champion and summoner spell lists. The champion list is only
+    downloaded by ID, since the name lookups are built from its keys.
+    '''
+    if version is None:
+        version = (await client.static_get_versions())[0]
+    champions = await client.static_get_champion_list(data_by_id=True)
+    spells = await client.static_get_summoner_spell_list(data_by_id=True)
+    return {
+        'version': version,
+        'champions': champions['data'],
+        'spells': spells['data']
+    }
+
+class Champion():
+    '''
+    The fields of a champion that the plugin uses.
+    '''
+    __slots__ = ('id', 'key', 'name')
+
+    def __init__(self, data):
+        self.id = data['id']
+        self.key = sys.intern(data['key'])
+        self.name = sys.intern(data['name'])
+
+class StaticData():
+    '''
+    Champion, summoner spell, and queue names from a static data snapshot.
+    Names are kept in lists indexed by ID, so table rows look them up without
+    converting IDs to strings, and everything else in the snapshot is dropped.
+    Queue names that are not known are "Unknown".
+    '''
+    __slots__ = ('version', 'champion_names', 'spell_names', 'queue_names',
+            'champion_index')
+
+    def __init__(self, snapshot):
+        self.version = snapshot['version']
+        champions = [Champion(it) for it in snapshot['champions'].values()]
+        self.champion_names = self.get_names(
+                (it.id, it.name) for it in champions)
+        self.spell_names = self.get_names((it['id'], sys.intern(it['name']))
+                for it in snapshot['spells'].values())
+        self.queue_names = self.get_names(queues.items(), default='Unknown')
+        self.champion_index = ChampionIndex(champions)
+
+    def get_names(self, pairs, default=None):
+        '''
+        Returns a list of the names of the (ID, name) pairs indexed by ID.
+        '''
+        pairs = list(pairs)
+        names = [default] * (max(it[0] for it in pairs) + 1 if pairs else 0)
+        for key, name in pairs:
+            names[key] = name
+        return names
+
+    def get_queue_name(self, queue):
+        '''
+        Returns the name of the given queue ID, or of the queue type of a
+        finished match.
+        '''
+        if type(queue) is str:
+            queue = queue_types.get(queue, -1)
+        if 0 <= queue < len(self.queue_names):
+            return self.queue_names[queue]
+        return 'Unknown'
+
+async def update_static_data(bot, version):
+    '''
+    Checks if Riot has a newer patch than the given version. If so, the static
+    data is downloaded, saved, and swapped in. Until then, commands are served
+    from the current snapshot.
+    '''
+    try:
+        client = get_client(bot)
+        latest = (await client.static_get_versions())[0]
+        if latest == version:
+            return
+        logging.debug("Updating static data to version " + latest)
+        snapshot = await get_static_snapshot(client, version=latest)
+    except Exception as e:
+        logging.warn("Failed to update the static data: " + str(e))
+        return
+    save_static_snapshot(bot, snapshot)
+    bot.data['discrank.py']['static'] = StaticData(snapshot)
+
 async def get_response(bot, message, parsed_command, direct):
 
     response = ''
@@ -753,114 +3169,135 @@ async def get_response(bot, message, parsed_command, direct):
 
     if base == 'blitz':
 
-        static = bot.data['discrank.py'] # Static data and the watcher
+        static = bot.data['discrank.py']['static'] # Swapped on a new patch
+        client = get_client(bot, options.get('region'),
+                None if direct else message.server)
+        context = RequestContext(client) # Shared by this command only
         if plan_index == 0: # Get basic summoner information
-            response = get_summoner_information(bot, static, static[0],
+            response = await get_summoner_information(static, context,
                     options['summoner'], verbose=('extra' in options))
         elif plan_index == 1: # Get match information
-            response = get_match_table_wrapper(bot, static, static[0],
+            response = await get_match_table_wrapper(static, context,
                     options['match'], verbose=(not 'basic' in options))
         elif plan_index == 2: # Get mastery table
             champion = options['champion'] if 'champion' in options else None
-            response = get_mastery_table(bot, static, static[0],
+            response = await get_mastery_table(static, context,
                     options['mastery'], champion=champion)
         elif plan_index == 3: # Challenge
-            response = get_challenge_result(bot, static, static[0], arguments)
+            response = await get_challenge_result(static, context, arguments)
         elif plan_index == 4: # Chests
-            response = get_chests(bot, static, static[0], options['chests']) 
+            response = await get_chests(static, context, options['chests'])
+        elif plan_index in (5, 6): # Add or remove from the watchlist
+            if direct:
+                allowed = servers.is_owner(bot, message.author.id)
+            else:
+                allowed = servers.is_mod(bot, message.server, message.author.id)
+            if not allowed:
+                raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                        "Only moderators can change the watchlist.")
+            if plan_index == 5:
+                response = await modify_watchlist(
+                        bot, context, options['watch'], True)
+            else:
+                response = await modify_watchlist(
+                        bot, context, options['unwatch'], False)
+        elif plan_index == 7: # Show the watchlist
+            response = get_watchlist(bot)
+        elif plan_index == 8: # Track a live game
+            response, tracker = await get_tracker_response(
+                    bot, static, client, options['track'])
+            if tracker: # Get the message reference back to edit it
+                message_type = 3
+                extra = tracker.add
+        elif plan_index == 9: # Set the default region of the server
+            if direct:
+                raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                        "The default region can only be set on a server.")
+            if not servers.is_mod(bot, message.server, message.author.id):
+                raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                        "Only moderators can set the default region.")
+            response = set_default_region(
+                    bot, message.server, options['defaultregion'])
+        elif plan_index == 10: # Bracket or round robin challenge event
+            response = await get_bracket_result(bot, static, context,
+                    arguments, seed=options.get('seed'),
+                    round_robin=('roundrobin' in options))
+        elif plan_index == 11: # Match history summary
+            response, fetch_missing = await get_history_response(bot, static,
+                    client, options['history'],
+                    arguments[0] if arguments else None)
+            if fetch_missing: # Edit in the rest of the matches
+                message_type = 3
+                extra = fetch_missing
+        elif plan_index == 12: # Request and cache metrics
+            response = get_stats_response(bot)
+        elif plan_index in (13, 14, 15): # Leaderboard of the server
+            if direct:
+                raise BotException(ErrorTypes.RECOVERABLE, EXCEPTION,
+                        "The leaderboard is only available on a server.")
+            if plan_index == 13:
+                response = await link_summoner(bot, message.server,
+                        message.author, context, options['link'])
+            elif plan_index == 14:
+                response = unlink_summoner(bot, message.server, message.author)
+            else:
+                response = get_leaderboard_response(
+                        bot, message.server, message.author)
+
+        if context.stale_age is not None: # Answered with expired data
+            minutes = max(1, math.ceil(context.stale_age / 60))
+            response += ('\n*The Riot API is busy right now, so some of this '
+                    'may be out of date (up to {} minute{} old).*').format(
+                            minutes, '' if minutes == 1 else 's')
+        if context.live_unchecked:
+            response += ('\n*The Riot API is busy right now, so this could '
+                    'not check for a live game.*')
 
     return (response, tts, message_type, extra)
 
 async def on_ready(bot):
 
-    # Obtain all static data required
-    watcher = RiotWatcher(bot.configurations['discrank.py']['token'])
-    if not watcher.can_make_request():
-        raise BotException(ErrorTypes.STARTUP, EXCEPTION,
-            "The given Riot API token cannot get requests.")
-
-    # Add champions by ID and name, and skills by ID
-    champions = watcher.static_get_champion_list(data_by_id=True)['data']
-    champions_named = watcher.static_get_champion_list()['data']
-    champions_named = dict(
-            (key.lower(), value) for key, value in champions_named.items())
-    champions.update(champions_named)
-    spells = watcher.static_get_summoner_spell_list(data_by_id=True)['data']
-
-    # Add game modes by queue type and name
-    modes = {
-        "0": "Custom",
-        "8": "Normal 3v3",
-        "2": "Normal",
-        "14": "Normal Draft",
-        "4": "Dynamic Queue",
-        "6": "Dynamic Queue",
-        "9": "Ranked 3v3",
-        "41": "Ranked 3v3",
-        "42": "Ranked 5v5",
-        "16": "This Gamemode doesn't even exist anymore",
-        "17": "Same with this one",
-        "7": "Co-op vs AI",
-        "25": "Co-op vs AI",
-        "31": "Co-op vs AI",
-        "32": "Co-op vs AI",
-        "33": "Co-op vs AI",
-        "52": "Co-op vs AI (3v3)",
-        "61": "Team Builder",
-        "65": "ARAM",
-        "70": "One For All",
-        "72": "Magma Chamber 1v1",
-        "73": "Magma Chamber 2v2",
-        "75": "Hexakill",
-        "76": "URF",
-        "83": "Co-op vs AI (URF)",
-        "91": "Doom Bots Lv 1",
-        "92": "Doom Bots Lv 2",
-        "93": "Doom Bots Lv 3",
-        "96": "Ascension",
-        "98": "Hexakill",
-        "100": "Bilgewater",
-        "300": "Legend of the Poro King",
-        "313": "Bilgewater ARAM",
-        "400": "Team Builder",
-        "410": "Dynamic Queue",
-        "CUSTOM": "0",
-        "NORMAL_3x3": "8",
-        "NORMAL_5x5_BLIND": "2",
-        "NORMAL_5x5_DRAFT": "14",
-        "RANKED_SOLO_5x5": "4",
-        "RANKED_PREMADE_5x5*": "6",
-        "RANKED_PREMADE_3x3*": "9",
-        "RANKED_TEAM_3x3": "41",
-        "RANKED_TEAM_5x5": "42",
-        "ODIN_5x5_BLIND": "16",
-        "ODIN_5x5_DRAFT": "17",
-        "BOT_5x5*": "7",
-        "BOT_ODIN_5x5": "25",
-        "BOT_5x5_INTRO": "31",
-        "BOT_5x5_BEGINNER": "32",
-        "BOT_5x5_INTERMEDIATE": "33",
-        "BOT_TT_3x3": "52",
-        "GROUP_FINDER_5x5": "61",
-        "ARAM_5x5": "65",
-        "ONEFORALL_5x5": "70",
-        "FIRSTBLOOD_1x1": "72",
-        "FIRSTBLOOD_2x2": "73",
-        "SR_6x6": "75",
-        "URF_5x5": "76",
-        "BOT_URF_5x5": "83",
-        "NIGHTMARE_BOT_5x5_RANK1": "91",
-        "NIGHTMARE_BOT_5x5_RANK2": "92",
-        "NIGHTMARE_BOT_5x5_RANK5": "93",
-        "ASCENSION_5x5": "96",
-        "HEXAKILL": "98",
-        "BILGEWATER_ARAM_5x5": "100",
-        "KING_PORO_5x5": "300",
-        "COUNTER_PICK": "310",
-        "BILGEWATER_5x5": "313",
-        "TEAM_BUILDER_DRAFT_UNRANKED_5x5": "400",
-        "TEAM_BUILDER_DRAFT_RANKED_5x5": "410"
+    # Reuse the clients (and their sessions) if this is a reconnect
+    if 'discrank.py' in bot.data:
+        clients = bot.data['discrank.py']['clients']
+        server_regions = bot.data['discrank.py']['regions']
+        start_tasks = False
+    else:
+        clients = {} # Region: client, created as regions are used
+        server_regions = load_regions(bot)
+        start_tasks = True
+    region = get_region(bot.configurations['discrank.py'].get('region', 'na'))
+    if region not in clients:
+        clients[region] = create_client(bot, region)
+    client = clients[region]
+
+    # Serve champion, spell and queue names from the saved snapshot
+    snapshot = load_static_snapshot(bot)
+    if snapshot is None: # Nothing to serve commands from, so wait for it
+        try:
+            snapshot = await get_static_snapshot(client)
+        except APIError as e:
+            raise BotException(ErrorTypes.STARTUP, EXCEPTION,
+                "The given Riot API token cannot get requests.", e=e)
+        save_static_snapshot(bot, snapshot)
+        updated = True
+    else:
+        updated = False
+
+    bot.data['discrank.py'] = {
+        'clients': clients, # Region: client
+        'regions': server_regions, # Server ID: default region
+        'static': StaticData(snapshot)
     }
 
-    bot.data['discrank.py'] = [watcher, champions, spells, modes]
+    # Check for a new patch in the background
+    if not updated:
+        asyncio.ensure_future(update_static_data(bot, snapshot['version']))
+
+    # Start keeping the watchlist and leaderboards fresh once everything is
+    # ready
+    if start_tasks:
+        load_leaderboards(bot)
+        asyncio.ensure_future(refresh_watchlist(bot))
+        asyncio.ensure_future(refresh_leaderboards(bot))
 